@@ -1,19 +1,122 @@
 # Imports.
+import os
 import pytest
+from datetime import datetime
 
+import database
 from app import create_app
-from database import drop_database_tables
+from database import add_sample_data, drop_database_tables, init_database
+
+# Shared-cache in-memory database, so tests never touch the on-disk library.db.
+# Named per pytest-xdist worker so parallel runs (pytest -n auto) never share one
+TEST_DATABASE = "file:library_test_{}?mode=memory&cache=shared".format(
+    os.environ.get("PYTEST_XDIST_WORKER", "main"))
+
+# In-memory database holding the schema and sample data, built once per session and copied into TEST_DATABASE before each test
+TEMPLATE_DATABASE = "file:library_template_{}?mode=memory&cache=shared".format(
+    os.environ.get("PYTEST_XDIST_WORKER", "main"))
+
+# Time the service layer sees as "now" in tests that use the frozen_now fixture
+FROZEN_NOW = datetime(2024, 1, 15, 12, 0, 0)
+
+# Epoch timestamp time.time() returns in tests that use the frozen_time fixture
+FROZEN_TIME = 1762743099.451787
+
+class FrozenDatetime(datetime):
+    """ datetime whose now() always returns FROZEN_NOW. """
+    @classmethod
+    def now(cls, tz=None):
+        return FROZEN_NOW
 
 # Fixtures.
-@pytest.fixture
-def test_setup():
+@pytest.fixture(scope="session")
+def template_db():
     """
-    Deletes old database and starts the app.
+    Builds the schema and sample data once per session in an in-memory template database, and yields a
+    connection to it. The template lives as long as this connection is open.
+    """
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(database, "DATABASE", TEMPLATE_DATABASE)
+
+        conn = database.get_db_connection()
+        init_database()
+        add_sample_data()
+
+    yield conn
+
+    conn.close()
+
+@pytest.fixture(scope="module")
+def db_conn():
+    """
+    Points the app at a fresh in-memory database and yields one connection to it, shared by a
+    module's test helpers. The in-memory database lives as long as this connection is open.
+    """
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(database, "DATABASE", TEST_DATABASE)
+
+        conn = database.get_db_connection()
+
+        yield conn
+
+        conn.close()
+
+@pytest.fixture(scope="module")
+def app_setup(db_conn):
+    """
+    Starts the app on the in-memory database, once per test module.
     """
-    drop_database_tables()
     app = create_app()
     
     app.config['TESTING'] = True
     
-    with app.app_context():
-        yield app
+    return app
+
+@pytest.fixture
+def test_setup(app_setup, db_conn, template_db):
+    """
+    Resets the database to the sample data by copying the template over it, and runs the test in the app context.
+    """
+    template_db.backup(db_conn)
+    
+    with app_setup.app_context():
+        yield app_setup
+
+@pytest.fixture
+def seed_borrow(db_conn):
+    """
+    Returns a function that adds rows of (patron_id, book_id, borrow_date, due_date[, return_date])
+    to the borrow_records table in one transaction. Rows without a return date are current loans.
+    """
+    def _seed(rows):
+        with db_conn:
+            db_conn.executemany('''
+                INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [tuple(row) + (None,) * (5 - len(row)) for row in rows])
+    return _seed
+
+@pytest.fixture
+def live_db_setup():
+    """
+    Deletes old on-disk database and recreates it with the sample data, for end-to-end tests
+    that go through the running app server.
+    """
+    drop_database_tables()
+    create_app()
+
+@pytest.fixture
+def frozen_now(monkeypatch):
+    """
+    Freezes the service layer's clock at FROZEN_NOW, so date math in tests is deterministic.
+    """
+    monkeypatch.setattr("services.library_service.datetime", FrozenDatetime)
+    return FROZEN_NOW
+
+@pytest.fixture
+def frozen_time(monkeypatch):
+    """
+    Freezes time.time() at FROZEN_TIME, so timestamps and transaction IDs the payment gateway derives from it are deterministic.
+    """
+    monkeypatch.setattr("time.time", lambda: FROZEN_TIME)
+    return FROZEN_TIME
@@ -11,8 +11,8 @@ from typing import Dict, List, Optional, Tuple
 DATABASE = 'library.db'
 
 def get_db_connection():
-    """Get a database connection."""
-    conn = sqlite3.connect(DATABASE)
+    """Get a database connection. DATABASE may be a file path or a "file:" URI."""
+    conn = sqlite3.connect(DATABASE, uri=DATABASE.startswith('file:'))
     conn.row_factory = sqlite3.Row  # This enables column access by name
     return conn
 
@@ -45,9 +45,49 @@ def init_database():
         )
     ''')
     
+    # Trigram full-text index over book titles and authors, so substring searches don't scan the catalog.
+    # It stores no text of its own (content='books') and is kept in sync by the triggers below.
+    fts_exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'books_fts'").fetchone()
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_fts
+        USING fts5(title, author, content='books', content_rowid='id', tokenize='trigram')
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title, author ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+    ''')
+    if not fts_exists:
+        # Index any books already in a database created before the full-text index existed
+        conn.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+    
+    # Index borrow records by patron, covering both current-loan lookups and a patron's full history
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_patron
+        ON borrow_records (patron_id, return_date)
+    ''')
+    
     conn.commit()
     conn.close()
 
+# Sample books as (title, author, isbn, copies)
+SAMPLE_BOOKS = [
+    ('The Great Gatsby', 'F. Scott Fitzgerald', '9780743273565', 3),
+    ('To Kill a Mockingbird', 'Harper Lee', '9780061120084', 2),
+    ('1984', 'George Orwell', '9780451524935', 1)
+]
+
 def add_sample_data():
     """Add sample data to the database if it's empty."""
     conn = get_db_connection()
@@ -55,17 +95,11 @@ def add_sample_data():
     
     if book_count == 0:
         # Add sample books
-        sample_books = [
-            ('The Great Gatsby', 'F. Scott Fitzgerald', '9780743273565', 3),
-            ('To Kill a Mockingbird', 'Harper Lee', '9780061120084', 2),
-            ('1984', 'George Orwell', '9780451524935', 1)
-        ]
-        
-        for title, author, isbn, copies in sample_books:
-            conn.execute('''
-                INSERT INTO books (title, author, isbn, total_copies, available_copies)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (title, author, isbn, copies, copies))
+        conn.executemany('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(title, author, isbn, copies, copies)
+              for title, author, isbn, copies in SAMPLE_BOOKS])
         
         # Make 1984 unavailable by adding a borrow record
         conn.execute('''
@@ -85,6 +119,7 @@ def add_sample_data():
 def drop_database_tables():
     """ Drop database tables. """
     conn = get_db_connection()
+    conn.execute("DROP TABLE IF EXISTS `books_fts`")
     conn.execute("DROP TABLE IF EXISTS `books`")
     conn.execute("DROP TABLE IF EXISTS `borrow_records`")
     conn.commit()
@@ -99,6 +134,36 @@ def get_all_books() -> List[Dict]:
     conn.close()
     return [dict(book) for book in books]
 
+def search_books(search_type: str, search_term: str) -> List[Dict]:
+    """
+    Search books by title or author (partial, case-insensitive). ISBN lookups go through get_book_by_isbn.
+    Other search types return no results.
+    """
+    if search_type in ('title', 'author'):
+        # search_type is whitelisted above, so it is safe to use as a column name.
+        # A term of three or more characters is matched as a quoted phrase, which the trigram index
+        # answers as a substring match, folding case for non-ASCII letters as well.
+        # Shorter terms have no trigram to look up, so they fall back to a LIKE scan (ASCII-only
+        # case folding) with wildcards escaped so they match literally.
+        if len(search_term) >= 3:
+            condition = f"books_fts.{search_type} MATCH ?"
+            params = ('"' + search_term.replace('"', '""') + '"',)
+        else:
+            escaped = search_term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            condition = f"books_fts.{search_type} LIKE ? ESCAPE '\\'"
+            params = (f'%{escaped}%',)
+        query = f'''
+            SELECT books.* FROM books_fts JOIN books ON books.id = books_fts.rowid
+            WHERE {condition} ORDER BY books.title
+        '''
+    else:
+        return []
+
+    conn = get_db_connection()
+    books = conn.execute(query, params).fetchall()
+    conn.close()
+    return [dict(book) for book in books]
+
 def get_book_by_id(book_id: int) -> Optional[Dict]:
     """Get a specific book by ID."""
     conn = get_db_connection()
@@ -106,6 +171,14 @@ def get_book_by_id(book_id: int) -> Optional[Dict]:
     conn.close()
     return dict(book) if book else None
 
+def get_books_by_ids(book_ids: List[int]) -> Dict[int, Dict]:
+    """Get several books by ID in one query, keyed by book ID."""
+    placeholders = ','.join('?' * len(book_ids))
+    conn = get_db_connection()
+    books = conn.execute(f'SELECT * FROM books WHERE id IN ({placeholders})', list(book_ids)).fetchall()
+    conn.close()
+    return {book['id']: dict(book) for book in books}
+
 def get_book_by_isbn(isbn: str) -> Optional[Dict]:
     """Get a specific book by ISBN."""
     conn = get_db_connection()
@@ -138,103 +211,151 @@ def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
     
     return borrowed_books
 
-def get_all_patron_record(patron_id: str) -> List[Dict]:
-    """Get all books ever borrowed by patron."""
+def get_patron_records_with_due(patron_id: str) -> List[Dict]:
+    """Get all books ever borrowed by a patron, past and present, with due dates, in one query."""
     conn = get_db_connection()
     records = conn.execute('''
-        SELECT br.*, b.title, b.author 
+        SELECT br.book_id, br.borrow_date, br.due_date, br.return_date, b.title, b.author
         FROM borrow_records br 
         JOIN books b ON br.book_id = b.id 
         WHERE br.patron_id = ?
         ORDER BY br.borrow_date
     ''', (patron_id,)).fetchall()
     conn.close()
-    
-    borrow_record = []
-    for record in records:
 
-        return_date = record['return_date']
-        # Return date handling: only convert to datetime if it exists
-        if return_date:
-            return_date = datetime.fromisoformat(return_date)
+    return [{
+        'book_id': record['book_id'],
+        'title': record['title'],
+        'author': record['author'],
+        'borrow_date': datetime.fromisoformat(record['borrow_date']),
+        'due_date': datetime.fromisoformat(record['due_date']),
+        'return_date': datetime.fromisoformat(record['return_date']) if record['return_date'] else None
+    } for record in records]
 
-        borrow_record.append({
-            'book_id': record['book_id'],
-            'title': record['title'],
-            'author': record['author'],
-            'borrow_date': datetime.fromisoformat(record['borrow_date']),
-            'due_date': datetime.fromisoformat(record['due_date']),
-            'return_date': return_date
-        })
-    
-    return borrow_record
-
-def get_patron_borrow_count(patron_id: str) -> int:
-    """Get the number of books currently borrowed by a patron."""
+def get_borrow_context(patron_id: str, book_id: int) -> Optional[Dict]:
+    """
+    Get everything needed to decide whether a patron can borrow a book, in one query.
+    Returns None if the book does not exist, otherwise
+    {"book": Dict, "has_this": bool, "count": int} where has_this is whether the patron
+    currently has this book and count is how many books the patron currently has.
+    """
     conn = get_db_connection()
-    count = conn.execute('''
-        SELECT COUNT(*) as count FROM borrow_records 
-        WHERE patron_id = ? AND return_date IS NULL
-    ''', (patron_id,)).fetchone()['count']
+    row = conn.execute('''
+        SELECT b.*,
+            EXISTS(
+                SELECT 1 FROM borrow_records
+                WHERE patron_id = ? AND book_id = b.id AND return_date IS NULL
+            ) AS has_this,
+            (
+                SELECT COUNT(*) FROM borrow_records
+                WHERE patron_id = ? AND return_date IS NULL
+            ) AS current_count
+        FROM books b
+        WHERE b.id = ?
+    ''', (patron_id, patron_id, book_id)).fetchone()
     conn.close()
-    return count
 
-def insert_book(title: str, author: str, isbn: str, total_copies: int, available_copies: int) -> bool:
-    """Insert a new book into the database."""
+    if not row:
+        return None
+
+    book = dict(row)
+    return {
+        'book': book,
+        'has_this': bool(book.pop('has_this')),
+        'count': book.pop('current_count')
+    }
+
+def create_borrow_atomic(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> Optional[bool]:
+    """
+    Take one available copy of a book and insert its borrow record in a single transaction.
+    The copy is only taken if one is still available, so concurrent borrows cannot overdraw it.
+    Returns True if borrowed, False if no copy was available, None on a database error.
+    """
     conn = get_db_connection()
     try:
-        conn.execute('''
-            INSERT INTO books (title, author, isbn, total_copies, available_copies)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (title, author, isbn, total_copies, available_copies))
-        conn.commit()
+        with conn:
+            taken = conn.execute('''
+                UPDATE books SET available_copies = available_copies - 1
+                WHERE id = ? AND available_copies > 0
+            ''', (book_id,)).rowcount
+            if taken:
+                conn.execute('''
+                    INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+                    VALUES (?, ?, ?, ?)
+                ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
         conn.close()
-        return True
+        return bool(taken)
     except Exception as e:
         conn.close()
-        return False
+        return None
 
-def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> bool:
-    """Insert a new borrow record into the database."""
+def create_borrows_atomic(patron_id: str, book_ids: List[int], borrow_date: datetime, due_date: datetime) -> Optional[bool]:
+    """
+    Take one available copy of each book and insert all of their borrow records in a single transaction.
+    Nothing is borrowed unless every book still has a copy available.
+    Returns True if borrowed, False if any book had no copy available, None on a database error.
+    """
+    placeholders = ','.join('?' * len(book_ids))
     conn = get_db_connection()
     try:
-        conn.execute('''
-            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
-            VALUES (?, ?, ?, ?)
-        ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
-        conn.commit()
+        with conn:
+            taken = conn.execute(f'''
+                UPDATE books SET available_copies = available_copies - 1
+                WHERE id IN ({placeholders}) AND available_copies > 0
+            ''', list(book_ids)).rowcount
+            if taken == len(book_ids):
+                conn.executemany('''
+                    INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+                    VALUES (?, ?, ?, ?)
+                ''', [(patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()) for book_id in book_ids])
+            else:
+                conn.rollback()
         conn.close()
-        return True
+        return taken == len(book_ids)
     except Exception as e:
         conn.close()
-        return False
+        return None
 
-def update_book_availability(book_id: int, change: int) -> bool:
-    """Update the available copies of a book by a given amount (+1 for return, -1 for borrow)."""
+def insert_book(title: str, author: str, isbn: str, total_copies: int, available_copies: int) -> Optional[bool]:
+    """
+    Insert a new book into the database unless its ISBN is already in use.
+    Returns True if inserted, False if the ISBN already exists, None on a database error.
+    """
     conn = get_db_connection()
     try:
-        conn.execute('''
-            UPDATE books SET available_copies = available_copies + ? WHERE id = ?
-        ''', (change, book_id))
+        cursor = conn.execute('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(isbn) DO NOTHING
+        ''', (title, author, isbn, total_copies, available_copies))
         conn.commit()
         conn.close()
-        return True
+        return cursor.rowcount == 1
     except Exception as e:
         conn.close()
-        return False
+        return None
 
-def update_borrow_record_return_date(patron_id: str, book_id: int, return_date: datetime) -> bool:
-    """Update the return date for a borrow record."""
+def close_loan(patron_id: str, book_id: int, return_date: datetime) -> Tuple[bool, Optional[datetime]]:
+    """
+    Record the return of a patron's current loan and put the copy back, in a single transaction.
+    Returns (success, due_date): success is False on a database error, and due_date is the
+    closed loan's due date, or None if the patron had no current loan of the book.
+    """
     conn = get_db_connection()
     try:
-        conn.execute('''
-            UPDATE borrow_records 
-            SET return_date = ? 
-            WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
-        ''', (return_date.isoformat(), patron_id, book_id))
-        conn.commit()
+        with conn:
+            closed = conn.execute('''
+                UPDATE borrow_records
+                SET return_date = ?
+                WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+                RETURNING due_date
+            ''', (return_date.isoformat(), patron_id, book_id)).fetchall()
+            if closed:
+                conn.execute('''
+                    UPDATE books SET available_copies = available_copies + ? WHERE id = ?
+                ''', (len(closed), book_id))
         conn.close()
-        return True
+        return True, datetime.fromisoformat(closed[0]['due_date']) if closed else None
     except Exception as e:
         conn.close()
-        return False
+        return False, None
@@ -6,13 +6,20 @@ Contains all the core business logic for the Library Management System
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from database import (
-    get_book_by_id, get_book_by_isbn, get_patron_borrow_count,
-    insert_book, insert_borrow_record, update_book_availability,
-    update_borrow_record_return_date, get_all_books, get_patron_borrowed_books, get_all_patron_record
+    get_book_by_id, get_book_by_isbn, get_books_by_ids, get_borrow_context, create_borrow_atomic, create_borrows_atomic,
+    insert_book, close_loan, get_patron_borrowed_books, get_patron_records_with_due, search_books
 )
 import re
 from services.payment_service import PaymentGateway
 
+# Whole-string validators, compiled once at import
+_ISBN_RE = re.compile(r"\A\d{13}\Z")
+_PATRON_RE = re.compile(r"\A\d{6}\Z")
+
+def _loans_by_id(patron_id: str) -> Dict[int, Dict]:
+    """Get a patron's currently borrowed books keyed by book ID."""
+    return {record["book_id"]: record for record in get_patron_borrowed_books(patron_id)}
+
 def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
     """
     Add a new book to the catalog.
@@ -43,29 +50,28 @@ def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -
     if isbn is None:
         return False, "ISBN cannot be None. Must only be comprised of digits in a string."
     
-    if len(isbn) != 13:
-        return False, "ISBN must be exactly 13 digits."
-    
-    if ' ' in isbn:
-        return False, "ISBN cannot have spaces."
-    
-    if not isbn.isdigit():
+    # A valid ISBN passes in a single scan; the checks below only run to explain a rejection
+    if not _ISBN_RE.match(isbn):
+        if len(isbn) != 13:
+            return False, "ISBN must be exactly 13 digits."
+        
+        if ' ' in isbn:
+            return False, "ISBN cannot have spaces."
+        
         return False, "ISBN must be digits"
 
     if not isinstance(total_copies, int) or total_copies <= 0:
         return False, "Total copies must be a positive integer."
     
-    # Check for duplicate ISBN
-    existing = get_book_by_isbn(isbn)
-    if existing:
+    # Insert new book; a duplicate ISBN is detected by the insert itself
+    inserted = insert_book(title.strip(), author.strip(), isbn, total_copies, total_copies)
+    if inserted is None:
+        return False, "Database error occurred while adding the book."
+    
+    if not inserted:
         return False, "A book with this ISBN already exists."
     
-    # Insert new book
-    success = insert_book(title.strip(), author.strip(), isbn, total_copies, total_copies)
-    if success:
-        return True, f'Book "{title.strip()}" has been successfully added to the catalog.'
-    else:
-        return False, "Database error occurred while adding the book."
+    return True, f'Book "{title.strip()}" has been successfully added to the catalog.'
 
 def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     """
@@ -80,44 +86,92 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
         tuple: (success: bool, message: str)
     """
     # Validate patron ID
-    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+    if not patron_id or not _PATRON_RE.match(patron_id):
         return False, "Invalid patron ID. Must be exactly 6 digits."
     
-    # Check if book exists and is available
-    book = get_book_by_id(book_id)
-    if not book:
+    # Book, whether the patron already has it, and the patron's current borrow count in one query
+    context = get_borrow_context(patron_id, book_id)
+    if not context:
         return False, "Book not found."
     
+    book = context["book"]
     if book['available_copies'] <= 0:
         return False, "This book is currently not available."
     
     # Check if patron is trying to borrow a copy of a book that they have currently borrowed
-    patron_curr_books = get_patron_borrowed_books(patron_id)
-    for curr_book in patron_curr_books:
-        if curr_book["book_id"] == book_id:
-            return False, "You have already borrowed a copy of this book."
+    if context["has_this"]:
+        return False, "You have already borrowed a copy of this book."
     
     # Check patron's current borrowed books count
-    current_borrowed = get_patron_borrow_count(patron_id)
-    
-    if current_borrowed >= 5:
+    if context["count"] >= 5:
         return False, "You have reached the maximum borrowing limit of 5 books."
     
     # Create borrow record
     borrow_date = datetime.now()
     due_date = borrow_date + timedelta(days=14)
     
-    # Insert borrow record and update availability
-    borrow_success = insert_borrow_record(patron_id, book_id, borrow_date, due_date)
-    if not borrow_success:
+    # Take a copy and insert the borrow record in one transaction; the copy is only
+    # taken if one is still available, which covers a concurrent borrow of the last copy
+    borrowed = create_borrow_atomic(patron_id, book_id, borrow_date, due_date)
+    if borrowed is None:
         return False, "Database error occurred while creating borrow record."
     
-    availability_success = update_book_availability(book_id, -1)
-    if not availability_success:
-        return False, "Database error occurred while updating book availability."
+    if not borrowed:
+        return False, "This book is currently not available."
     
     return True, f'Successfully borrowed "{book["title"]}". Due date: {due_date.strftime("%Y-%m-%d")}.'
 
+def borrow_books_bulk(patron_id: str, book_ids: List[int]) -> Tuple[bool, str]:
+    """
+    Allow a patron to borrow several books at once, in a single transaction.
+    Applies the same rules as borrow_book_by_patron; if any book cannot be borrowed, none are.
+    
+    Args:
+        patron_id: 6-digit library card ID
+        book_ids: IDs of the books to borrow
+        
+    Returns:
+        tuple: (success: bool, message: str)
+    """
+    # Validate patron ID
+    if not patron_id or not _PATRON_RE.match(patron_id):
+        return False, "Invalid patron ID. Must be exactly 6 digits."
+    
+    if not book_ids:
+        return False, "No books to borrow."
+    
+    if len(set(book_ids)) != len(book_ids):
+        return False, "Cannot borrow more than one copy of the same book."
+    
+    books = get_books_by_ids(book_ids)
+    borrowed = _loans_by_id(patron_id)
+    for book_id in book_ids:
+        book = books.get(book_id)
+        if not book:
+            return False, "Book not found."
+        
+        if book['available_copies'] <= 0:
+            return False, f'"{book["title"]}" is currently not available.'
+        
+        if book_id in borrowed:
+            return False, f'You have already borrowed a copy of "{book["title"]}".'
+    
+    if len(borrowed) + len(book_ids) > 5:
+        return False, "You have reached the maximum borrowing limit of 5 books."
+    
+    borrow_date = datetime.now()
+    due_date = borrow_date + timedelta(days=14)
+    
+    # Take every copy and insert every borrow record in one transaction
+    success = create_borrows_atomic(patron_id, book_ids, borrow_date, due_date)
+    if success is None:
+        return False, "Database error occurred while creating borrow records."
+    
+    if not success:
+        return False, "One or more of these books is currently not available."
+    
+    return True, f'Successfully borrowed {len(book_ids)} books. Due date: {due_date.strftime("%Y-%m-%d")}.'
+
 def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     """
     Process book return by a patron.
@@ -131,36 +185,27 @@ def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
         tuple: (success: bool, message: str)
     """
 
-    patron_current_books = get_patron_borrowed_books(patron_id)
+    return_date = datetime.now()
 
-    borrowed_book = [record for record in patron_current_books if record["book_id"] == book_id]
-    if not borrowed_book:
-        return False, "You have not currently borrowed this book."
+    # Record the return and put the copy back in one transaction
+    success, due_date = close_loan(patron_id, book_id, return_date)
+    if not success:
+        return False, "Database error occurred while updating book return date."
     
-    # Update available copies
-    availability_success = update_book_availability(book_id, +1)
-    if not availability_success:
-        return False, "Database error occurred while updating book availability."
+    if due_date is None:
+        return False, "You have not currently borrowed this book."
     
-    # Calculates any late fees owed
-    calculate_fee = calculate_late_fee_for_book(patron_id, book_id)
+    # Calculates any late fees owed from the closed loan's due date
+    calculate_fee = _compute_fee_for_due_date(due_date, return_date)
     late_fees = calculate_fee["fee_amount"]
     days_late = calculate_fee["days_overdue"]
 
-    # Update return date
-    return_date = datetime.now()
-    
-    # Record return date
-    update_return_date = update_borrow_record_return_date(patron_id, book_id, return_date)
-    if not update_return_date:
-        return False, "Database error occurred while updating book return date."
-
     if late_fees == 0.00:
         return True, f'You have successfully returned your book. There are no late fees on this book. Thank you!'
     
     return True, f'You have successfully returned your book. This book is {days_late} days late and you owe ${calculate_fee["fee_amount"]:.2f} in late fees for this book.'
 
-def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
+def calculate_late_fee_for_book(patron_id: str, book_id: int, now: Optional[datetime] = None) -> Dict:
     """
     Calculate late fees for a specific book.
     Implements R5 as per requirements  
@@ -168,61 +213,41 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
     Args:
         patron_id: 6-digit library card ID
         book_id: ID of the book to borrow
+        now: Time to measure lateness against (defaults to the current time)
     
     Returns:
         dict: {"fee_amount": float, "days_overdue": int}
     """
 
-    patron_current_books = get_patron_borrowed_books(patron_id)
-
-    borrowed_book = [record for record in patron_current_books if record["book_id"] == book_id]
+    borrowed_book = _loans_by_id(patron_id).get(book_id)
 
     # Check if no borrowed books
     if not borrowed_book:
         return {"fee_amount": 0.00, "days_overdue": 0}
 
-    for book in borrowed_book:
-        overdue_status = book["is_overdue"]
+    return _compute_fee_for_due_date(borrowed_book["due_date"], now)
 
-    # Check if book is overdue
-    if not overdue_status:
-        return {"fee_amount": 0.00, "days_overdue": 0}
+def _compute_fee_for_due_date(due_date: datetime, now: Optional[datetime] = None) -> Dict:
+    """
+    Calculate the late fee for a book due at due_date.
     
-    today = datetime.now()
-    for book in borrowed_book:
-        borrow_due_date = book["due_date"]
-
-    # Get number of days overdue
-    time_diff = today - borrow_due_date
-    num_days_overdue = time_diff.days
-
-    overdue_amt = 0.00
-
-    # $0.50/day for first 7 days overdue
-    if num_days_overdue <= 7:
-        overdue_amt = num_days_overdue * 0.50
-        return {"fee_amount": overdue_amt, "days_overdue": num_days_overdue}
+    Args:
+        due_date: When the book was due
+        now: Time to measure lateness against (defaults to the current time)
     
-    # $1.00/day for each additional day after 7 days
-    # elif (num_days_overdue > 7):
-    #     overdue_amt = (7 * 0.50) + ((num_days_overdue - 7) * 1.00)
+    Returns:
+        dict: {"fee_amount": float, "days_overdue": int}
+    """
+    if now is None:
+        now = datetime.now()
 
-    #     if overdue_amt < 15.00:
-    #         return {"fee_amount": overdue_amt, "days_overdue": num_days_overdue}
-        
-    #     # Maximum $15.00 late fee
-    #     else:
-    #         return {"fee_amount": 15.00, "days_overdue": num_days_overdue}
+    # Whole days overdue (0 if not overdue)
+    num_days_overdue = max(0, (now - due_date).days)
 
-    else:
-        overdue_amt = (7 * 0.50) + ((num_days_overdue - 7) * 1.00)
+    # $0.50/day for the first 7 days, $1.00/day after that, capped at $15.00
+    overdue_amt = min(15.00, 0.50 * min(num_days_overdue, 7) + 1.00 * max(0, num_days_overdue - 7))
 
-        if overdue_amt < 15.00:
-            return {"fee_amount": overdue_amt, "days_overdue": num_days_overdue}
-        
-        # Maximum $15.00 late fee
-        else:
-            return {"fee_amount": 15.00, "days_overdue": num_days_overdue}
+    return {"fee_amount": overdue_amt, "days_overdue": num_days_overdue}
 
 
 def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
@@ -238,28 +263,20 @@ def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
         List[Dict]: [{"id": int, "title": str, "author": str, "isbn": str, "total_copies": int, "available_copies": int}]
     """
     
-    all_books = get_all_books()
-
-    search_results = []
+    # ISBN is an exact match: a term that isn't a valid ISBN can't match, and a valid one is a
+    # single lookup on the unique ISBN index
+    if search_type == "isbn":
+        if not search_term or not _ISBN_RE.match(search_term):
+            return []
+        book = get_book_by_isbn(search_term)
+        return [book] if book else []
 
-    for b in all_books:
+    # Title is searched as requested; any other type searches by author
+    if search_type != "title":
+        search_type = "author"
 
-        # Support exact matching for isbn
-        if search_type == "isbn":
-            if "isbn" in b and b["isbn"] == search_term:
-                search_results.append(b)
-        
-        # Support partial matching for title (case-insensitive)
-        elif search_type == "title":
-            if "title" in b and search_term.lower() in b["title"].lower():
-                search_results.append(b)
-
-        # Support partial matching for author (case-insensitive)
-        else:
-            if "author" in b and search_term.lower() in b["author"].lower():
-                search_results.append(b)
-
-    return search_results
+    # Filtering happens in the database: partial case-insensitive match for title/author
+    return search_books(search_type, search_term)
 
 def get_patron_status_report(patron_id: str) -> Dict:
     """
@@ -290,37 +307,15 @@ def get_patron_status_report(patron_id: str) -> Dict:
             }
     """
 
-    patron_current_books = get_patron_borrowed_books(patron_id)
-
-    # Currently borrowed books with due dates
-    currently_borrowed = []
-    for books in patron_current_books:
-        currently_borrowed.append({
-            "book_id": books.get("book_id"),
-            "title": books.get("title"),
-            "borrow_date": books.get("borrow_date"),
-            "due_date": books.get("due_date")
-        })
-
-    # Number of books currently borrowed
-    num_currently_borrowed = len(currently_borrowed)
-
-    # Total late fees owed
-    book_fees = []
-    for id in currently_borrowed:
-        book_fees.append(calculate_late_fee_for_book(patron_id, id.get("book_id")))
-    
-    overdue_fees = []
-    for fee_amt in book_fees:
-        overdue_fees.append(float(fee_amt.get("fee_amount")))
-    
-    total_overdue = sum(overdue_fees)
+    now = datetime.now()
 
-    # Get patron's borrowing record (past and present)
-    patron_all_books = get_all_patron_record(patron_id)
+    # Patron's borrowing record (past and present) in one query
+    patron_all_books = get_patron_records_with_due(patron_id)
 
-    # Borrowing history
+    # Borrowing history, currently borrowed books with due dates, and total late fees owed, in one pass
+    currently_borrowed = []
     borrowing_history = []
+    total_overdue = 0.0
     for item in patron_all_books:
         borrowing_history.append({
             "book_id": item.get("book_id"),
@@ -328,6 +323,18 @@ def get_patron_status_report(patron_id: str) -> Dict:
             "return_date": item.get("return_date")
         })
 
+        if item.get("return_date") is None:
+            currently_borrowed.append({
+                "book_id": item.get("book_id"),
+                "title": item.get("title"),
+                "borrow_date": item.get("borrow_date"),
+                "due_date": item.get("due_date")
+            })
+            total_overdue += _compute_fee_for_due_date(item["due_date"], now)["fee_amount"]
+
+    # Number of books currently borrowed
+    num_currently_borrowed = len(currently_borrowed)
+
     # Round overdue amt to two decimal places
     total_overdue_rounded = round(total_overdue, 2)
 
@@ -338,6 +345,16 @@ def get_patron_status_report(patron_id: str) -> Dict:
         "borrowing_history": borrowing_history
     }
 
+# Gateway used when callers don't inject one; built on first use and then reused
+_default_gateway = None
+
+def _get_default_gateway() -> PaymentGateway:
+    """Get the shared default payment gateway, creating it on first use."""
+    global _default_gateway
+    if _default_gateway is None:
+        _default_gateway = PaymentGateway()
+    return _default_gateway
+
 def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway = None) -> Tuple[bool, str, Optional[str]]:
     """
     Process payment for late fees using external payment gateway.
@@ -360,7 +377,7 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway
         success, msg, txn = pay_late_fees("123456", 1, mock_gateway)
     """
     # Validate patron ID
-    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+    if not patron_id or not _PATRON_RE.match(patron_id):
         return False, "Invalid patron ID. Must be exactly 6 digits.", None
     
     # Calculate late fee first
@@ -380,9 +397,9 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway
     if not book:
         return False, "Book not found.", None
     
-    # Use provided gateway or create new one
+    # Use provided gateway or the shared default one
     if payment_gateway is None:
-        payment_gateway = PaymentGateway()
+        payment_gateway = _get_default_gateway()
     
     # Process payment through external gateway
     # THIS IS WHAT YOU SHOULD MOCK IN THEIR TESTS!
@@ -427,9 +444,9 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway:
     if amount > 15.00:  # Maximum late fee per book
         return False, "Refund amount exceeds maximum late fee."
     
-    # Use provided gateway or create new one
+    # Use provided gateway or the shared default one
     if payment_gateway is None:
-        payment_gateway = PaymentGateway()
+        payment_gateway = _get_default_gateway()
     
     # Process refund through external gateway
     # THIS IS WHAT YOU SHOULD MOCK IN YOUR TESTS!
@@ -1,52 +1,40 @@
 import pytest
+from unittest.mock import MagicMock
 from services.library_service import add_book_to_catalog
 
-from conftest import test_setup
+# Just over the 200 character title and 100 character author limits
+_LONG_TITLE = ("Title " * 34).strip()
+_LONG_AUTHOR = ("author " * 15).strip()
+assert len(_LONG_TITLE) > 200 and len(_LONG_AUTHOR) > 100
 
-def test_add_book_invalid_total_copies_negative(test_setup):
+# Fixtures.
+@pytest.fixture
+def mock_db(monkeypatch):
     """
-    Test adding a book with total copies being a negative integer.
+    Replace the database connection with a MagicMock, for tests whose input fails validation before any SQL runs.
     """
-    success, message = add_book_to_catalog("Test Negative Copies", "Negative Nathan", "1000000000000", -5)
+    conn = MagicMock()
+    get_conn = MagicMock(return_value=conn)
+    monkeypatch.setattr("database.get_db_connection", get_conn)
+    return get_conn
 
-    assert success == False
-    assert "total copies" in message.lower()
-
-def test_add_book_invalid_missing_title(test_setup):
-    """
-    Test adding a book with missing title.
-    """
-    success, message = add_book_to_catalog("", "Some Title-less Author", "1000000000100", 8)
-
-    assert success == False
-    assert "title is required" in message.lower()
-
-def test_add_book_invalid_title_too_long(test_setup):
-    """
-    Test adding a book with title having more than 200 characters
-    """
-    success, message = add_book_to_catalog("Title title title title title title title title title title title title title title title title title title title title title title title title title title title title title titles titles titles titles", "Some Author", "1000000000001", 8)
-
-    assert success == False
-    assert "200 characters" in message.lower()
-
-def test_add_book_invalid_missing_author(test_setup):
-    """
-    Test adding a book with missing author.
-    """
-    success, message = add_book_to_catalog("No Author", "", "1000000000200", 4)
-
-    assert success == False
-    assert "author is required" in message.lower()
-
-def test_add_book_invalid_author_too_long(test_setup):
+# Tests.
+@pytest.mark.parametrize("title, author, isbn, total_copies, expected", [
+    pytest.param("Test Negative Copies", "Negative Nathan", "1000000000000", -5, "total copies", id="total_copies_negative"),
+    pytest.param("", "Some Title-less Author", "1000000000100", 8, "title is required", id="missing_title"),
+    pytest.param(_LONG_TITLE, "Some Author", "1000000000001", 8, "200 characters", id="title_too_long"),
+    pytest.param("No Author", "", "1000000000200", 4, "author is required", id="missing_author"),
+    pytest.param("Title 1", _LONG_AUTHOR, "1000000000002", 4, "100 characters", id="author_too_long"),
+])
+def test_add_book_invalid_input(mock_db, title, author, isbn, total_copies, expected):
     """
-    Test adding a book with an author having more than 100 characters.
+    Test adding a book with invalid total copies, title or author.
     """
-    success, message = add_book_to_catalog("Title 1", "author author author author author author author author author author authors authors authors authors", "1000000000002", 4)
+    success, message = add_book_to_catalog(title, author, isbn, total_copies)
 
     assert success == False
-    assert "100 characters" in message.lower()
+    assert expected in message.lower()
+    mock_db.assert_not_called()
 
 def test_add_book_invalid_duplicate_isbn(test_setup):
     """
@@ -62,35 +50,17 @@ def test_add_book_invalid_duplicate_isbn(test_setup):
     assert success == False
     assert "ISBN already exists" in message
 
-def test_add_book_invalid_isbn_input_none_type(test_setup):
-    """
-    Test adding a book with invalid ISBN (None).
-    """
-
-    # Add a book with None as ISBN input
-    success, message = add_book_to_catalog("Title 4", "Another Author", None, 10)
-
-    assert success == False
-    assert "cannot be None" in message
-
-def test_add_book_invalid_isbn_input_whitespace(test_setup):
+@pytest.mark.parametrize("isbn, expected", [
+    pytest.param(None, "cannot be None", id="none_type"),
+    pytest.param("             ", "cannot have spaces", id="whitespace"),
+    pytest.param("abcdefghijklm", "must be digits", id="not_digits"),
+])
+def test_add_book_invalid_isbn_input(mock_db, isbn, expected):
     """
-    Test adding a book with invalid ISBN (whitespace characters).
+    Test adding a book with invalid ISBN (None, whitespace characters, not digits).
     """
-
-    # Add a book with whitespace characters as ISBN input
-    success, message = add_book_to_catalog("Title 4", "Another Author", "             ", 10)
-    
-    assert success == False
-    assert "cannot have spaces" in message
-
-def test_add_book_invalid_isbn_input_not_digits(test_setup):
-    """
-    Test adding a book with invalid ISBN (not digits).
-    """
-
-    # Add a book with non-digits as ISBN input
-    success, message = add_book_to_catalog("Title 4", "Another Author", "abcdefghijklm", 10)
+    success, message = add_book_to_catalog("Title 4", "Another Author", isbn, 10)
     
     assert success == False
-    assert "must be digits" in message
+    assert expected in message
+    mock_db.assert_not_called()
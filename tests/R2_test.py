@@ -1,76 +1,32 @@
+import pytest
 from database import get_all_books
-from routes.catalog_routes import catalog
-from conftest import test_setup
 
-# Tests.
-def test_get_all_books_id(test_setup):
-    """ 
-    Test if "id" is included in each returned row and is equal to an integer value. 
-    """
-
-    results = get_all_books()
-
-    # Check if "id" is included in all rows and is an integer value.
-    for result in results:
-        assert "id" in result.keys()
-        assert type(result["id"]) == int
-
-def test_get_all_books_title(test_setup):
-    """ 
-    Test if "title" is included in each returned row and is equal to a string value. 
+# Fixtures.
+@pytest.fixture(scope="module")
+def all_books(app_setup):
     """
-
-    results = get_all_books()
-
-    # Check if "title" is included in all rows and is a string value.
-    for result in results:
-        assert "title" in result.keys()
-        assert type(result["title"]) == str
-
-def test_get_all_books_author(test_setup):
-    """ 
-    Test if "author" is included in each returned row and is equal to a string value. 
+    Get all books once for the module, since these tests only read the catalog.
     """
+    return get_all_books()
 
-    results = get_all_books()
-
-    # Check if "author" is included in all rows and is a string value.
-    for result in results:
-        assert "author" in result.keys()
-        assert type(result["author"]) == str
-
-def test_get_all_books_isbn(test_setup):
-    """ 
-    Test if "isbn" is included in each returned row and is equal to a string value. 
-    """
-
-    results = get_all_books()
-    
-    # Check if "isbn" is included in all rows and is a string value.
-    for result in results:
-        assert "isbn" in result.keys()
-        assert type(result["isbn"]) == str
-
-def test_get_all_books_total_copies(test_setup):
-    """ 
-    Test if "total_copies" is included in each returned row and is equal to an integer value. 
-    """
-
-    results = get_all_books()
-
-    # Check if "total_copies" is included in all rows and is an integer value.
-    for result in results:
-        assert "total_copies" in result.keys()
-        assert type(result["total_copies"]) == int
-
-def test_get_all_books_available_copies(test_setup):
+# Tests.
+@pytest.mark.parametrize("key, expected_type", [
+    ("id", int),
+    ("title", str),
+    ("author", str),
+    ("isbn", str),
+    ("total_copies", int),
+    ("available_copies", int),
+])
+def test_get_all_books_fields(all_books, key, expected_type):
     """ 
-    Test if "available_copies" is included in each returned row and is equal to an integer value. 
+    Test if each field is included in each returned row and is equal to a value of the expected type. 
     """
 
-    results = get_all_books()
+    # The catalog holds the 3 sample books, so the loop below can't pass vacuously
+    assert len(all_books) == 3
 
-    # Check if "available_copies" is included in all rows and is an integer value.
-    for result in results:
-        assert "available_copies" in result.keys()
-        assert type(result["available_copies"]) == int
+    # Check if the field is included in all rows and is of the expected type.
+    for result in all_books:
+        assert key in result.keys()
+        assert type(result[key]) == expected_type
@@ -1,8 +1,26 @@
 import pytest
-from services.library_service import borrow_book_by_patron, add_book_to_catalog
-from conftest import test_setup
+from services import library_service
+from services.library_service import borrow_book_by_patron, borrow_books_bulk, add_book_to_catalog
 
-def test_borrow_book_valid_input(test_setup):
+pytestmark = pytest.mark.usefixtures("test_setup")
+
+# Fixtures.
+@pytest.fixture
+def borrow_limit_books(test_setup, db_conn):
+    """
+    Seed 6 books for the borrowing limit test with one executemany, and return their IDs.
+    """
+    rows = [(f"Testing Borrowing Limits {i}", f"Test Author {i}", f"101010101010{i}", 10, 10) for i in range(1, 7)]
+    with db_conn:
+        db_conn.executemany("""
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES (?, ?, ?, ?, ?)
+        """, rows)
+    return [row["id"] for row in db_conn.execute("SELECT id FROM books WHERE isbn LIKE '101010101010_' ORDER BY isbn")]
+
+# Tests.
+
+def test_borrow_book_valid_input():
     """
     Test borrowing a book with valid input
     """
@@ -11,7 +29,7 @@ def test_borrow_book_valid_input(test_setup):
     assert success == True
     assert "Successfully borrowed" in message
 
-def test_borrow_book_invalid_patron_id(test_setup):
+def test_borrow_book_invalid_patron_id():
     """
     Test borrowing a book with invalid patron ID
     """
@@ -33,7 +51,7 @@ def test_borrow_book_invalid_patron_id(test_setup):
     assert success3 == False
     assert "6 digits" in message3
 
-def test_borrow_book_invalid_book_doesnt_exist(test_setup):
+def test_borrow_book_invalid_book_doesnt_exist():
     """
     Test borrowing a book that does not exist
     """
@@ -42,7 +60,7 @@ def test_borrow_book_invalid_book_doesnt_exist(test_setup):
     assert success == False
     assert "not found" in message
 
-def test_borrow_book_invalid_no_availability(test_setup):
+def test_borrow_book_invalid_no_availability():
     """
     Test borrowing a book that is not currently available (no available copies)
     """
@@ -51,32 +69,39 @@ def test_borrow_book_invalid_no_availability(test_setup):
     assert success == False
     assert "not available" in message
 
-def test_borrow_book_invalid_exceeded_borrowing_limit(test_setup):
+def test_borrow_book_invalid_exceeded_borrowing_limit(borrow_limit_books):
     """
     Test borrowing a book with patron that has exceeded the maximum borrowing limit of 5 books
     """
-    # Add 6 books to catalog
-    _, _ = add_book_to_catalog("Testing Borrowing Limits 1", "Test Author 1", "1010101010101", 10)
-    _, _ = add_book_to_catalog("Testing Borrowing Limits 2", "Test Author 2", "1010101010102", 10)
-    _, _ = add_book_to_catalog("Testing Borrowing Limits 3", "Test Author 3", "1010101010103", 10)
-    _, _ = add_book_to_catalog("Testing Borrowing Limits 4", "Test Author 4", "1010101010104", 10)
-    _, _ = add_book_to_catalog("Testing Borrowing Limits 5", "Test Author 5", "1010101010105", 10)
-    _, _ = add_book_to_catalog("Testing Borrowing Limits 6", "Test Author 6", "1010101010106", 10)
-
-    # Borrow 5 books
-    _, _ = borrow_book_by_patron("100003", 4)
-    _, _ = borrow_book_by_patron("100003", 5)
-    _, _ = borrow_book_by_patron("100003", 6)
-    _, _ = borrow_book_by_patron("100003", 7)
-    _, _ = borrow_book_by_patron("100003", 8)
+    # Borrow 5 books in one transaction
+    _, _ = borrow_books_bulk("100003", borrow_limit_books[:5])
 
     # Borrow 6th book --> should return False
-    success, message = borrow_book_by_patron("100003", 9)
+    success, message = borrow_book_by_patron("100003", borrow_limit_books[5])
 
     assert success == False
     assert "maximum borrowing limit" in message
 
-def test_borrow_book_update_available_copies(test_setup):
+def test_borrow_books_bulk_all_or_nothing(db_conn):
+    """
+    Test borrowing several books at once borrows all of them, or none if any one cannot be borrowed
+    """
+    # "1984" (book 3) has no available copies, so nothing is borrowed
+    success1, message1 = borrow_books_bulk("100006", [1, 2, 3])
+
+    assert success1 == False
+    assert "not available" in message1
+    assert db_conn.execute("SELECT COUNT(*) FROM borrow_records WHERE patron_id = ?", ("100006",)).fetchone()[0] == 0
+
+    success2, message2 = borrow_books_bulk("100006", [1, 2])
+    available = [row["available_copies"] for row in db_conn.execute("SELECT available_copies FROM books WHERE id IN (1, 2) ORDER BY id")]
+
+    assert success2 == True
+    assert "Successfully borrowed 2 books" in message2
+    assert db_conn.execute("SELECT COUNT(*) FROM borrow_records WHERE patron_id = ?", ("100006",)).fetchone()[0] == 2
+    assert available == [2, 1]
+
+def test_borrow_book_update_available_copies():
     """
     Test borrowing a book will update book availability and create a borrow record
     """
@@ -96,7 +121,7 @@ def test_borrow_book_update_available_copies(test_setup):
     assert success2 == False
     assert "not available" in message2
 
-def test_borrow_book_another_copy(test_setup):
+def test_borrow_book_another_copy():
     """
     Test borrowing another copy of a book that is already currently borrowed
     """
@@ -110,3 +135,22 @@ def test_borrow_book_another_copy(test_setup):
     # Checking to see that patron is only allowed to borrow one copy at a time
     assert success1 == False
     assert "already borrowed a copy" in message1.lower()
+
+def test_borrow_book_last_copy_taken_concurrently(db_conn, mocker):
+    """
+    Test borrowing a book whose last copy was taken after availability was checked
+    """
+    # Patron sees "1984" (book 3) as available, but its only copy is already borrowed
+    mocker.patch.object(library_service, "get_borrow_context", return_value={"book": {"title": "1984", "available_copies": 1}, "has_this": False, "count": 0})
+
+    success, message = borrow_book_by_patron("100021", 3)
+
+    assert success == False
+    assert "not available" in message
+
+    # No borrow record was created and availability did not go negative
+    records = db_conn.execute("SELECT * FROM borrow_records WHERE patron_id = ?", ("100021",)).fetchall()
+    available = db_conn.execute("SELECT available_copies FROM books WHERE id = 3").fetchone()["available_copies"]
+
+    assert len(records) == 0
+    assert available == 0
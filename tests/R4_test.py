@@ -1,42 +1,23 @@
-from database import get_db_connection
+import sqlite3
 import pytest
 from services.library_service import return_book_by_patron, borrow_book_by_patron, add_book_to_catalog, calculate_late_fee_for_book
-from conftest import test_setup
-from datetime import timedelta, datetime
+from datetime import timedelta
+
+pytestmark = pytest.mark.usefixtures("test_setup")
 
 # Helper function to simulate test conditions
-def get_borrow_records(patron_id: str, book_id: int) -> None:
+def get_borrow_records(conn: sqlite3.Connection, patron_id: str, book_id: int) -> list[sqlite3.Row]:
     """ 
-    Get all records that match the patron id and book id.
+    Get all records that match the patron id and book id, as rows supporting access by column name.
     """
-    conn = get_db_connection()
-    records = conn.execute('''
+    return conn.execute('''
     SELECT * FROM borrow_records WHERE patron_id = ? AND book_id = ?
     ''', (
         patron_id, 
         book_id
     )).fetchall()
-    conn.close()
-    return [dict(record) for record in records]
 
-def add_row_to_borrowed_books(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> None:
-    """ 
-    Add a row to the borrow_records database. 
-    """
-    conn = get_db_connection()
-    conn.execute('''
-    INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
-    VALUES (?, ?, ?, ?)
-    ''', (
-        patron_id, 
-        book_id, 
-        borrow_date,
-        due_date
-    ))
-    conn.commit()
-    conn.close()
-
-def test_return_book_valid_input(test_setup):
+def test_return_book_valid_input():
     """
     Test returning a book with valid input
     """
@@ -48,14 +29,14 @@ def test_return_book_valid_input(test_setup):
     success2, _ = return_book_by_patron("100005", 1)
     assert success2 == True
 
-def test_return_book_invalid_not_curr_borrowed(test_setup):
+def test_return_book_invalid_not_curr_borrowed():
     """
     Test having a patron return a book that they have not currently borrowed
     """
     success, _ = return_book_by_patron("100006", 5)
     assert success == False
 
-def test_return_book_update_available_copies(test_setup):
+def test_return_book_update_available_copies():
     """
     Test if available copies is updated after returning the book
     """
@@ -79,7 +60,7 @@ def test_return_book_update_available_copies(test_setup):
     success5, _ = borrow_book_by_patron("100007", 4)
     assert success5 == True
 
-def test_return_book_update_return_date(test_setup):
+def test_return_book_update_return_date(db_conn):
     """
     Test if return date is updated after returning the book
     """
@@ -96,17 +77,17 @@ def test_return_book_update_return_date(test_setup):
     assert success2 == True
 
     # Check if return date has been updated
-    results = get_borrow_records("100008", 4)
+    results = get_borrow_records(db_conn, "100008", 4)
     assert len(results) == 1
     assert results[0]["return_date"] is not None
 
-def test_return_book_successfully_late(test_setup):
+def test_return_book_successfully_late(seed_borrow, frozen_now):
     """
     Test if correct message with late fee amount and days overdue is displayed when successfully returning a book that was overdue
     """
 
     # Add book to the database that is 10 days overdue
-    add_row_to_borrowed_books(patron_id="100009", book_id=1, borrow_date=datetime.today() - timedelta(days=24), due_date=datetime.today() - timedelta(days=10))
+    seed_borrow([("100009", 1, frozen_now - timedelta(days=24), frozen_now - timedelta(days=10))])
 
     result = calculate_late_fee_for_book("100009", 1)
 
@@ -1,81 +1,33 @@
 import pytest
 from services.library_service import calculate_late_fee_for_book
-from database import get_db_connection
 from datetime import timedelta, datetime
-from conftest import test_setup
-
-# Helper function to simulate test conditions
-def add_row_to_borrowed_books(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> None:
-    """ 
-    Add a row to the borrow_records database. 
-    """
-    conn = get_db_connection()
-    conn.execute('''
-    INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
-    VALUES (?, ?, ?, ?)
-    ''', (
-        patron_id, 
-        book_id, 
-        borrow_date,
-        due_date
-    ))
-    conn.commit()
-    conn.close()
 
+pytestmark = pytest.mark.usefixtures("test_setup")
 
-def test_late_fee_calculation_less_than_seven_days(test_setup):
-    """
-    Testing late fee calculation for an overdue book when less than 7 days overdue
-    """
-    # Add book to database that is 3 days overdue
-    add_row_to_borrowed_books(patron_id="111111", book_id=1, borrow_date=datetime.today() - timedelta(days=17), due_date=datetime.today() - timedelta(days=3))
-
-    result = calculate_late_fee_for_book("111111", 1)
-    
+@pytest.mark.parametrize("patron_id, days_past_due, fee, days_overdue", [
     # 3 days overdue x $0.50/day for first 7 days = $1.50
-    assert result["fee_amount"] == 1.50
-    assert result["days_overdue"] == 3
-
-def test_late_fee_calculation_more_than_seven_days(test_setup):
-    """
-    Testing late fee calculation for an overdue book when more than 7 days overdue but less than 19 days
-    """
-    # Add book to database that is 8 days overdue
-    add_row_to_borrowed_books(patron_id="111112", book_id=1, borrow_date=datetime.today() - timedelta(days=22), due_date=datetime.today() - timedelta(days=8))
-
-    result = calculate_late_fee_for_book("111112", 1)
-    
+    pytest.param("111111", 3, 1.50, 3, id="less_than_seven_days"),
     # (7 x 0.50) + (1 x 1.00) = 4.50
-    assert result["fee_amount"] == 4.50
-    assert result["days_overdue"] == 8
-    
-def test_late_fee_calculation_max_fee_for_book(test_setup):
-    """
-    Testing late fee calculation for an overdue book that has reached its maximum late fee (minimum lateness threshold to trigger this is 19 days) 
-    """
-    # Add book to database that is 19 days overdue
-    add_row_to_borrowed_books(patron_id="111113", book_id=1, borrow_date=datetime.today() - timedelta(days=33), due_date=datetime.today() - timedelta(days=19))
-
-    result = calculate_late_fee_for_book("111113", 1)
-    
+    pytest.param("111112", 8, 4.50, 8, id="more_than_seven_days"),
     # (7 days x 0.50) + (12 days x 1.00) = $15.50 but maximum late fee per book is 15.00
-    assert result["fee_amount"] == 15.00
-    assert result["days_overdue"] == 19
-
-def test_late_fee_calculation_no_late_books(test_setup):
+    pytest.param("111113", 19, 15.00, 19, id="max_fee_for_book"),
+    # Due tomorrow, so 0 days overdue = 0.00
+    pytest.param("111114", -1, 0.00, 0, id="no_late_books"),
+])
+def test_late_fee_calculation_thresholds(seed_borrow, frozen_now, patron_id, days_past_due, fee, days_overdue):
     """
-    Testing late fee calculation when no books are overdue
+    Testing late fee calculation below, above and at the maximum of the fee thresholds, and for a book that is not overdue
     """
-    # Add book to database that is not overdue
-    add_row_to_borrowed_books(patron_id="111114", book_id=1, borrow_date=datetime.today() - timedelta(days=15), due_date=datetime.today() + timedelta(days=1))
+    # Add book to database that was borrowed 14 days before its due date
+    due_date = frozen_now - timedelta(days=days_past_due)
+    seed_borrow([(patron_id, 1, due_date - timedelta(days=14), due_date)])
 
-    result = calculate_late_fee_for_book("111114", 1)
+    result = calculate_late_fee_for_book(patron_id, 1)
     
-    # 0 days overdue = 0.00
-    assert result["fee_amount"] == 0.00
-    assert result["days_overdue"] == 0
+    assert result["fee_amount"] == fee
+    assert result["days_overdue"] == days_overdue
     
-def test_late_fee_calculation_invalid_book(test_setup):
+def test_late_fee_calculation_invalid_book():
     """
     Testing late fee calculation for a book that is not currently borrowed
     """
@@ -84,3 +36,20 @@ def test_late_fee_calculation_invalid_book(test_setup):
     # 0 days overdue = 0.00
     assert result["fee_amount"] == 0.00
     assert result["days_overdue"] == 0
+
+def test_late_fee_calculation_at_given_time(seed_borrow):
+    """
+    Testing late fee calculation measured against a given time instead of the current time
+    """
+    # Add book to database that was due on January 1st, 2024
+    seed_borrow([("111116", 1, datetime(2023, 12, 18), datetime(2024, 1, 1))])
+
+    # Due in 2 days
+    result1 = calculate_late_fee_for_book("111116", 1, now=datetime(2023, 12, 30))
+    assert result1["fee_amount"] == 0.00
+    assert result1["days_overdue"] == 0
+
+    # 10 days overdue: (7 x 0.50) + (3 x 1.00) = 6.50
+    result2 = calculate_late_fee_for_book("111116", 1, now=datetime(2024, 1, 11))
+    assert result2["fee_amount"] == 6.50
+    assert result2["days_overdue"] == 10
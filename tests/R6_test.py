@@ -1,8 +1,9 @@
 import pytest
-from services.library_service import search_books_in_catalog
-from conftest import test_setup
+from services.library_service import search_books_in_catalog, add_book_to_catalog
 
-def test_search_books_matching_title(test_setup):
+pytestmark = pytest.mark.usefixtures("test_setup")
+
+def test_search_books_matching_title():
     """
     Test searching a book with an exact matching title, partial matching title, and a non-matching title
     """
@@ -18,7 +19,7 @@ def test_search_books_matching_title(test_setup):
     output3 = search_books_in_catalog("Non-Existing Title", "title")
     assert len(output3) == 0
 
-def test_search_books_matching_author(test_setup):
+def test_search_books_matching_author():
     """
     Test searching a book with an exact matching author, partial matching author, and a non-matching author
     """
@@ -34,7 +35,7 @@ def test_search_books_matching_author(test_setup):
     output3 = search_books_in_catalog("Non-exiting Author", "author")
     assert len(output3) == 0
 
-def test_search_books_case_insensitive(test_setup):
+def test_search_books_case_insensitive():
     """
     Test searching a book with a partial matching title and author despite case-insensitivity
     """
@@ -46,14 +47,14 @@ def test_search_books_case_insensitive(test_setup):
     output3 = search_books_in_catalog("f. scOTt fItz", "author")
     assert len(output3) == 1
 
-def test_search_books_mismatching_types(test_setup):
+def test_search_books_mismatching_types():
     """
     Test searching a book with incorrectly matched search term and search type input
     """
     output = search_books_in_catalog("The Great Gatsby", "isbn")
     assert len(output) == 0
 
-def test_search_books_matching_isbn(test_setup):
+def test_search_books_matching_isbn():
     """
     Test searching a book with matching and non-matching isbn
     """
@@ -65,3 +66,73 @@ def test_search_books_matching_isbn(test_setup):
     # Test non-matching isbn
     output2 = search_books_in_catalog("978074", "isbn")
     assert len(output2) == 0
+
+    # Test valid isbn that isn't in the catalog
+    output3 = search_books_in_catalog("9780000000000", "isbn")
+    assert len(output3) == 0
+
+def test_search_books_wildcard_characters_are_literal():
+    """
+    Test searching with SQL wildcard characters only matches them literally
+    """
+    # No sample title or author contains "%" or "_"
+    output1 = search_books_in_catalog("%", "title")
+    assert len(output1) == 0
+
+    output2 = search_books_in_catalog("_", "author")
+    assert len(output2) == 0
+
+def test_search_books_finds_newly_added_book():
+    """
+    Test searching finds a book added after the catalog was seeded, by partial title and author
+    """
+    _, _ = add_book_to_catalog("Brave New World", "Aldous Huxley", "9780060850524", 2)
+
+    output1 = search_books_in_catalog("new wor", "title")
+    assert len(output1) == 1
+    assert output1[0]["title"] == "Brave New World"
+
+    output2 = search_books_in_catalog("HUXLEY", "author")
+    assert len(output2) == 1
+
+def test_search_books_case_insensitive_non_ascii():
+    """
+    Test searching is case-insensitive for non-ASCII letters too
+    """
+    _, _ = add_book_to_catalog("Émile, ou De l'éducation", "Jean-Jacques Rousseau", "9782080701173", 1)
+
+    output1 = search_books_in_catalog("ÉMILE", "title")
+    assert len(output1) == 1
+
+    output2 = search_books_in_catalog("l'Éducation", "title")
+    assert len(output2) == 1
+
+@pytest.mark.parametrize("search_term, search_type", [
+    pytest.param("gatsby", "title", id="title"),
+    pytest.param("fitzgerald", "author", id="author"),
+    pytest.param("9780743273565", "isbn", id="isbn"),
+])
+def test_search_books_result_fields(search_term, search_type):
+    """
+    Test search results only carry the documented book fields, whatever the search type
+    """
+    output = search_books_in_catalog(search_term, search_type)
+
+    assert len(output) == 1
+    assert set(output[0]) == {"id", "title", "author", "isbn", "total_copies", "available_copies"}
+
+def test_search_books_finds_book_inserted_directly(db_conn):
+    """
+    Test searching finds a book written straight to the books table, not through add_book_to_catalog
+    """
+    with db_conn:
+        db_conn.execute("""
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES ('Ébène', 'Ryszard Kapuściński', '9782266126670', 1, 1)
+        """)
+
+    output1 = search_books_in_catalog("ÉBÈ", "title")
+    assert len(output1) == 1
+
+    output2 = search_books_in_catalog("KAPUŚ", "author")
+    assert len(output2) == 1
@@ -1,103 +1,74 @@
-from database import get_db_connection
 import pytest
+from services import library_service
 from services.library_service import get_patron_status_report
-from datetime import datetime, timedelta
-from conftest import test_setup
-
-# Helper function to simulate test conditions
-def add_row_to_borrowed_books(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime, return_date: datetime | None) -> None:
-    """ 
-    Add a row to the borrow_records database. 
-    """
-    conn = get_db_connection()
-    conn.execute('''
-    INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date)
-    VALUES (?, ?, ?, ?, ?)
-    ''', (
-        patron_id, 
-        book_id, 
-        borrow_date,
-        due_date,
-        return_date
-    ))
-    conn.commit()
-    conn.close()
-
-def test_get_patron_status_report_standard(test_setup):
+from datetime import timedelta
+
+pytestmark = pytest.mark.usefixtures("test_setup")
+
+# One day, for writing dates relative to the frozen clock
+DAY = timedelta(days=1)
+
+@pytest.mark.parametrize("patron_id, loans, fee, current_ids, history_len", [
+    # Loans are (book_id, borrowed, due, returned) in days relative to now; returned is None for current loans
+    pytest.param("111115", [
+        # Returned a day late (borrowing history)
+        (1, -42, -28, -27),
+        # Currently borrowed
+        (1, -12, 1, None),
+    ], 0.00, [1], 2, id="standard"),
+    pytest.param("111116", [], 0.00, [], 0, id="no_borrowing_history"),
+    pytest.param("111117", [
+        # Returned 4 days late and 20 days late
+        (1, -32, -18, -14),
+        (1, -36, -22, -2),
+    ], 0.00, [], 2, id="borrow_history_no_current"),
+    pytest.param("111118", [
+        # Currently borrowed books that are not overdue
+        (1, -3, 10, None),
+        (2, -8, 5, None),
+    ], 0.00, [1, 2], 2, id="no_overdue_books"),
+    pytest.param("111119", [
+        # Currently borrowed books that are overdue by 9 days ($5.50) and 30 days ($15.00)
+        (1, -23, -9, None),
+        (2, -44, -30, None),
+    ], 20.50, [1, 2], 2, id="overdue_books"),
+])
+def test_get_patron_status_report(seed_borrow, frozen_now, patron_id, loans, fee, current_ids, history_len):
     """
-    Test patron status for patron with a borrowing history and a currently borrowed book
+    Test patron status for patrons with and without borrowing history, and with current loans that are and are not overdue
     """
-    # Returned a day late (borrowing history)
-    add_row_to_borrowed_books(patron_id="111115", book_id=1, borrow_date=datetime.today() - timedelta(days=42), due_date=datetime.today() - timedelta(days=28), return_date=datetime.today() - timedelta(days=27))
-
-    # Currently borrowed
-    add_row_to_borrowed_books(patron_id="111115", book_id=1, borrow_date=datetime.today() - timedelta(days=12), due_date=datetime.today() + timedelta(days=1), return_date=None)
-
-    result = get_patron_status_report(patron_id="111115")
-
-    # Test patron status results
-    assert len(result["curr_borrowed_books"]) == 1
-    assert result["curr_borrowed_books"][0]["book_id"] == 1
-    assert result["total_late_fees_owed"] == 0.00
-    assert result["num_books_currently_borrowed"] == 1
-    assert result["borrowing_history"][0]["book_id"] == 1
+    seed_borrow([
+        (patron_id, book_id, frozen_now + borrowed * DAY, frozen_now + due * DAY, None if returned is None else frozen_now + returned * DAY)
+        for book_id, borrowed, due, returned in loans
+    ])
 
-def test_get_patron_status_report_no_borrowing_history(test_setup):
-    """
-    Test patron status for patron with no borrowing history
-    """
-    result = get_patron_status_report(patron_id="111116")
+    result = get_patron_status_report(patron_id=patron_id)
 
     # Test patron status results
-    assert len(result["curr_borrowed_books"]) == 0
-    assert result["total_late_fees_owed"] == 0.00
-    assert result["num_books_currently_borrowed"] == 0
+    assert sorted(book["book_id"] for book in result["curr_borrowed_books"]) == current_ids
+    assert result["num_books_currently_borrowed"] == len(current_ids)
+    assert result["total_late_fees_owed"] == fee
+    assert len(result["borrowing_history"]) == history_len
 
-def test_get_patron_status_report_borrow_history_no_current(test_setup):
+def test_get_patron_status_report_fetches_records_once(seed_borrow, frozen_now, mocker):
     """
-    Test patron status for patron with borrowing history but no currently borrowed books that are overdue
+    Test patron status fetches the patron's current loans and history in one query, regardless of how many are borrowed
     """
-    # Returned 4 day late
-    add_row_to_borrowed_books(patron_id="111117", book_id=1, borrow_date=datetime.today() - timedelta(days=32), due_date=datetime.today() - timedelta(days=18), return_date=datetime.today() - timedelta(days=14))
-
-    # Returned 20 days late
-    add_row_to_borrowed_books(patron_id="111117", book_id=1, borrow_date=datetime.today() - timedelta(days=36), due_date=datetime.today() - timedelta(days=22), return_date=datetime.today() - timedelta(days=2))
-
-    result = get_patron_status_report(patron_id="111117")
-
-    # Test patron status results
-    assert len(result["curr_borrowed_books"]) == 0
-    assert result["total_late_fees_owed"] == 0.00
-    assert result["num_books_currently_borrowed"] == 0
-
-def test_get_patron_status_report_no_overdue_books(test_setup):
-    """
-    Test patron status for patron with multiple currently borrowed books (none overdue)
-    """
-    # Add currently borrowed book that is not overdue
-    add_row_to_borrowed_books(patron_id="111118", book_id=1, borrow_date=datetime.today() - timedelta(days=3), due_date=datetime.today() + timedelta(days=10), return_date=None)
-
-    # Add currently borrowed book that is not overdue
-    add_row_to_borrowed_books(patron_id="111118", book_id=2, borrow_date=datetime.today() - timedelta(days=8), due_date=datetime.today() + timedelta(days=5), return_date=None)
-
-    result = get_patron_status_report(patron_id="111118")
-
-    # Test patron status results
-    assert result["total_late_fees_owed"] == 0.00
-    assert result["num_books_currently_borrowed"] == 2
-
-def test_get_patron_status_report_overdue_books(test_setup):
-    """
-    Test patron status for patron with multiple currently borrowed books that are overdue
-    """
-    # Add currently borrowed book that is overdue by 9 days
-    add_row_to_borrowed_books(patron_id="111119", book_id=1, borrow_date=datetime.today() - timedelta(days=23), due_date=datetime.today() - timedelta(days=9), return_date=None)
-
-    # Add currently borrowed book that is overdue by 30 days
-    add_row_to_borrowed_books(patron_id="111119", book_id=2, borrow_date=datetime.today() - timedelta(days=44), due_date=datetime.today() - timedelta(days=30), return_date=None)
-
-    result = get_patron_status_report(patron_id="111119")
-
-    # Test patron status results
-    assert result["total_late_fees_owed"] == 20.50
-    assert result["num_books_currently_borrowed"] == 2
+    seed_borrow([
+        # Add three currently borrowed books, two of them overdue
+        ("111120", 1, frozen_now - 17 * DAY, frozen_now - 3 * DAY, None),
+        ("111120", 2, frozen_now - 22 * DAY, frozen_now - 8 * DAY, None),
+        ("111120", 3, frozen_now - 2 * DAY, frozen_now + 12 * DAY, None),
+        # Returned 5 days late, which adds to the history but not the fees owed
+        ("111120", 1, frozen_now - 40 * DAY, frozen_now - 26 * DAY, frozen_now - 21 * DAY),
+    ])
+
+    spy = mocker.spy(library_service, "get_patron_records_with_due")
+
+    result = get_patron_status_report(patron_id="111120")
+
+    # (3 x 0.50) + ((7 x 0.50) + (1 x 1.00)) = 6.00
+    assert result["total_late_fees_owed"] == 6.00
+    assert result["num_books_currently_borrowed"] == 3
+    assert len(result["borrowing_history"]) == 4
+    assert spy.call_count == 1
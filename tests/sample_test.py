@@ -2,7 +2,6 @@ import pytest
 from services.library_service import (
     add_book_to_catalog
 )
-from conftest import test_setup
 
 def test_add_book_valid_input(test_setup):
     """Test adding a book with valid input."""
@@ -19,4 +18,4 @@ def test_add_book_invalid_isbn_too_short(test_setup):
     assert "13 digits" in message
 
 
-# Add more test methods for each function and edge case. You can keep all your test in a separate folder named `tests`.
\ No newline at end of file
+# Add more test methods for each function and edge case. You can keep all your test in a separate folder named `tests`.
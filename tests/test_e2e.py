@@ -1,7 +1,41 @@
 import pytest
-from playwright.sync_api import Page, expect
 
-def test_add_and_verify_new_book(test_setup, page: Page):
+# Skip (rather than error) at collection where Playwright isn't installed
+pytest.importorskip("playwright.sync_api")
+from playwright.sync_api import Browser, BrowserContext, Page, expect
+
+# End-to-end tests only run when selected with -m e2e
+pytestmark = pytest.mark.e2e
+
+# Fixtures.
+@pytest.fixture(scope="module")
+def context(browser: Browser, browser_context_args: dict):
+    """
+    One browser context shared by every test in this module, instead of pytest-playwright's context per test.
+    """
+    context = browser.new_context(**browser_context_args)
+    yield context
+    context.close()
+
+@pytest.fixture
+def page(context: BrowserContext):
+    """
+    A fresh page in the shared context, with the previous test's cookies (and flashed messages) cleared.
+    """
+    context.clear_cookies()
+    page = context.new_page()
+    yield page
+    page.close()
+
+@pytest.fixture(autouse=True)
+def page_timeouts(page: Page):
+    """
+    Fail fast on a missing element instead of waiting out Playwright's 30 second default.
+    """
+    page.set_default_timeout(5000)
+
+# Tests.
+def test_add_and_verify_new_book(live_db_setup, page: Page):
     """
     E2E testing for adding and verifying successful addition of new book
     """
@@ -15,7 +49,7 @@ def test_add_and_verify_new_book(test_setup, page: Page):
     page.get_by_role("link", name="➕ Add New Book").click()
 
     # Wait for redirection to add_book
-    page.wait_for_url("**/add_book")
+    page.wait_for_url("**/add_book", wait_until="domcontentloaded")
 
     # Check that we're on add_book page
     expect(page.locator("h2", has_text="➕ Add New Book")).to_be_visible()
@@ -30,7 +64,7 @@ def test_add_and_verify_new_book(test_setup, page: Page):
     page.get_by_role("button", name="Add Book to Catalog").click()
 
     # Wait for redirection to catalog
-    page.wait_for_url("**/catalog")
+    page.wait_for_url("**/catalog", wait_until="domcontentloaded")
 
     # Check that we were redirected back to the catalog page after successful addition
     expect(page.locator("h2", has_text="📖 Book Catalog")).to_be_visible()
@@ -41,7 +75,7 @@ def test_add_and_verify_new_book(test_setup, page: Page):
     expect(page.locator("td", has_text="0987654321234")).to_be_visible()
     expect(page.locator("td", has_text="20/20 Available")).to_be_visible()
 
-def test_borrow_and_return_book(test_setup, page: Page):
+def test_borrow_and_return_book(live_db_setup, page: Page):
     """
     E2E testing for borrowing a book, checking patron status to verify correct book has been borrowed for the correct user, and returning the book successfully 
     """
@@ -75,7 +109,7 @@ def test_borrow_and_return_book(test_setup, page: Page):
     page.get_by_role("link", name="👤 Patron Status").click()
 
     # Wait for redirection to catalog
-    page.wait_for_url("**/patron_status")
+    page.wait_for_url("**/patron_status", wait_until="domcontentloaded")
 
     # Check that we were redirected to the patron status page
     expect(page.locator("h2", has_text="👤 Patron Status")).to_be_visible()
@@ -96,7 +130,7 @@ def test_borrow_and_return_book(test_setup, page: Page):
     page.get_by_role("link", name="↩️ Return Book").click()
 
     # Wait for redirection to catalog
-    page.wait_for_url("**/return")
+    page.wait_for_url("**/return", wait_until="domcontentloaded")
 
     # Check that we were redirected to the return book page
     expect(page.locator("h2", has_text="↩️ Return Book")).to_be_visible()
@@ -116,7 +150,7 @@ def test_borrow_and_return_book(test_setup, page: Page):
     page.get_by_role("link", name="📖 Catalog").click()
 
     # Wait for redirection to catalog
-    page.wait_for_url("**/catalog")
+    page.wait_for_url("**/catalog", wait_until="domcontentloaded")
 
     # Check that we were redirected back to the catalog page after successful addition
     expect(page.locator("h2", has_text="📖 Book Catalog")).to_be_visible()
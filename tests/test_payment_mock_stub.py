@@ -1,181 +1,181 @@
+import inspect
 import pytest
-from unittest.mock import Mock
+from services import library_service, payment_service
 from services.library_service import pay_late_fees, refund_late_fee_payment, add_book_to_catalog, borrow_book_by_patron, return_book_by_patron
 from services.payment_service import PaymentGateway
 
-def test_pay_late_fees_successful_payment(mocker):
-    """
-    Test successful payment.
-    """
-    # Stub database functions that return valid values
-    mocker.patch("services.library_service.calculate_late_fee_for_book", return_value={"fee_amount": 10.50})
-    mocker.patch("database.get_book_by_id", return_value={"title": "The Great Gatsby"})
-
-    mock_gateway = Mock(spec=PaymentGateway)
-
-    # Mocked method in gateway should return successful response
-    mock_gateway.process_payment.return_value = (True, "txn_123", "success")
-    success, msg, txn = pay_late_fees("123456", 1, mock_gateway)
-
-    # Payment processed successfully through gateway
-    assert success == True
-    assert "Payment successful" in msg
-    assert txn == "txn_123"
+# Patron, book, and transaction used throughout the payment cases
+PATRON_ID = "123456"
+BOOK_ID = 1
+TXN_ID = "txn_123"
 
-    # Verify that method was called with the correct arguments
-    mock_gateway.process_payment.assert_called_with(
-        patron_id="123456",
-        amount=10.50,
-        description=f"Late fees for 'The Great Gatsby'"
-    )
+# Stubbed late fee and book for the common payment case
+GATSBY_FEE = {"fee_amount": 10.50}
+GATSBY = {"title": "The Great Gatsby"}
 
-def test_pay_late_fees_declined_payment(mocker):
+# Hand-written stand-in for PaymentGateway
+class StubGateway:
     """
-    Test when payment is declined by gateway.
+    Payment gateway stub that returns canned results (or raises them, if they are exceptions) and records every call.
     """
-    # Stub database functions that return valid values
-    mocker.patch("services.library_service.calculate_late_fee_for_book", return_value={"fee_amount": 10.50})
-    mocker.patch("database.get_book_by_id", return_value={"title": "The Great Gatsby"})
-
-    mock_gateway = Mock(spec=PaymentGateway)
+    def __init__(self, payment_result=(True, TXN_ID, "success"), refund_result=(True, "Refund processed successfully!")):
+        self.payment_result = payment_result
+        self.refund_result = refund_result
+        self.payment_calls = []
+        self.refund_calls = []
 
-    # Mocked method in gateway should return unsuccessful response
-    mock_gateway.process_payment.return_value = (False, "", "card declined")
-    success, msg, txn = pay_late_fees("123456", 1, mock_gateway)
+    def process_payment(self, patron_id, amount, description=""):
+        self.payment_calls.append({"patron_id": patron_id, "amount": amount, "description": description})
+        if isinstance(self.payment_result, Exception):
+            raise self.payment_result
+        return self.payment_result
 
-    # Payment processed unsuccessfully through gateway
-    assert success == False
-    assert "Payment failed" in msg
-    assert txn is None
-
-    mock_gateway.process_payment.assert_called_once()
+    def refund_payment(self, transaction_id, amount):
+        self.refund_calls.append((transaction_id, amount))
+        if isinstance(self.refund_result, Exception):
+            raise self.refund_result
+        return self.refund_result
 
-def test_pay_late_fees_invalid_patron_id():
+# Fixtures.
+@pytest.fixture
+def stub_gateway():
     """
-    Test invalid patron ID.
+    A fresh StubGateway with successful default results; tests override payment_result/refund_result as needed.
     """
-    mock_gateway = Mock(spec=PaymentGateway)
-
-    # Attempt to pay late fee with invalid patron id
-    success, msg, txn = pay_late_fees("id123", 1, mock_gateway)
-
-    assert success == False
-    assert "Invalid patron ID" in msg
-    assert txn is None
+    return StubGateway()
 
-    # Verify that gateway is not called
-    mock_gateway.process_payment.assert_not_called()
-
-def test_pay_late_fees_zero_late_fees(mocker):
+@pytest.fixture
+def stub_fee(monkeypatch, request):
     """
-    Test zero late fees.
+    Stubs the late fee calculation to return GATSBY_FEE, or the fee given through indirect parametrization.
     """
-    # Stub calculate_late_fee_for_book to simulate case when fee_amount is 0
-    mocker.patch("services.library_service.calculate_late_fee_for_book", return_value={"fee_amount": 0.0})
-
-    mock_gateway = Mock(spec=PaymentGateway)
-    success, msg, txn = pay_late_fees("123456", 1, mock_gateway)
-
-    assert success == False
-    assert "No late fees" in msg
-    assert txn is None
-
-    # Verify that gateway is not called
-    mock_gateway.process_payment.assert_not_called()
+    fee = getattr(request, "param", GATSBY_FEE)
+    monkeypatch.setattr(library_service, "calculate_late_fee_for_book", lambda patron_id, book_id, now=None: fee)
+    return fee
 
-def test_pay_late_fees_exception_handling(mocker):
+@pytest.fixture
+def stub_book(monkeypatch, request):
     """
-    Test network error exception handling.
+    Stubs the book lookup to return GATSBY, or the book given through indirect parametrization.
     """
-    # Stub database functions that return valid values
-    mocker.patch("services.library_service.calculate_late_fee_for_book", return_value={"fee_amount": 10.50})
-    mocker.patch("database.get_book_by_id", return_value={"title": "The Great Gatsby"})
-
-    mock_gateway = Mock(spec=PaymentGateway)
-
-    # Payment gateway should raise an exception
-    mock_gateway.process_payment.side_effect = Exception("network error")
-    success, msg, txn = pay_late_fees("123456", 1, mock_gateway)
+    book = getattr(request, "param", GATSBY)
+    monkeypatch.setattr(library_service, "get_book_by_id", lambda book_id: book)
+    return book
 
-    assert success == False
-    assert "Payment processing error" in msg
-    assert txn is None
-
-    mock_gateway.process_payment.assert_called_once()
+@pytest.fixture
+def mock_gateway(stub_gateway, mocker):
+    """
+    Patches PaymentGateway to construct the stub gateway and clears the shared default gateway, so the service has to create one.
+    """
+    mock_gateway = mocker.patch.multiple(library_service, PaymentGateway=mocker.DEFAULT, _default_gateway=None)["PaymentGateway"]
+    mock_gateway.return_value = stub_gateway
+    return mock_gateway
 
-def test_refund_late_fee_successful_refund():
+@pytest.fixture(autouse=True)
+def no_api_delay(monkeypatch):
     """
-    Test successful refund.
+    Skips the simulated API delay in PaymentGateway calls.
     """
-    mock_gateway = Mock(spec=PaymentGateway)
+    monkeypatch.setattr(payment_service.time, "sleep", lambda seconds: None)
 
-    # Mocked method in gateway should return successful response
-    mock_gateway.refund_payment.return_value = (True, "Refund processed successfully!")
+@pytest.fixture(scope="module")
+def gateway():
+    """
+    One PaymentGateway shared by the module; it keeps no state between calls.
+    """
+    return PaymentGateway()
 
-    # Refund valid amount
-    success, msg = refund_late_fee_payment("txn_123", 7.0, mock_gateway)
+# Tests.
+@pytest.mark.parametrize("stub_fee, stub_book, payment_result, expected_success, expected_msg, expected_txn, gateway_calls", [
+    # Payment processed successfully through gateway
+    pytest.param(GATSBY_FEE, GATSBY, (True, TXN_ID, "success"), True, "Payment successful", TXN_ID, 1, id="successful_payment"),
+    # Payment declined by gateway
+    pytest.param(GATSBY_FEE, GATSBY, (False, "", "card declined"), False, "Payment failed", None, 1, id="declined_payment"),
+    # Payment gateway raises a network error
+    pytest.param(GATSBY_FEE, GATSBY, Exception("network error"), False, "Payment processing error", None, 1, id="exception_handling"),
+    # Fee amount is 0, so the gateway is never called
+    pytest.param({"fee_amount": 0.0}, GATSBY, None, False, "No late fees", None, 0, id="zero_late_fees"),
+    # No fee could be calculated
+    pytest.param(None, GATSBY, None, False, "Unable to calculate late fees", None, 0, id="no_fee_amount"),
+    # Book is not in the database
+    pytest.param({"fee_amount": 3.0}, None, None, False, "Book not found", None, 0, id="no_book_found"),
+], indirect=["stub_fee", "stub_book"])
+def test_pay_late_fees(stub_fee, stub_book, stub_gateway, payment_result, expected_success, expected_msg, expected_txn, gateway_calls):
+    """
+    Test paying late fees through the gateway: successful, declined, and failing payments, and cases that never reach the gateway.
+    """
+    if payment_result is not None:
+        stub_gateway.payment_result = payment_result
 
-    assert success == True
-    assert "Refund processed successfully!" in msg
+    success, msg, txn = pay_late_fees(PATRON_ID, BOOK_ID, stub_gateway)
 
-    # Verify that method was called with the correct arguments
-    mock_gateway.refund_payment.assert_called_with("txn_123", 7.0)
+    assert (success, txn, len(stub_gateway.payment_calls)) == (expected_success, expected_txn, gateway_calls)
+    assert expected_msg in msg
 
-def test_refund_late_fee_invalid_transaction_id():
+def test_pay_late_fees_gateway_arguments(stub_fee, stub_book, stub_gateway):
     """
-    Test invalid transaction ID rejection.
+    Test the gateway is charged the patron's fee with a description naming the book.
     """
-    mock_gateway = Mock(spec=PaymentGateway)
-
-    # Attempt refund with invalid transaction id
-    success, msg = refund_late_fee_payment("", 7.0, mock_gateway)
-
-    assert success == False
-    assert "Invalid transaction ID" in msg
+    pay_late_fees(PATRON_ID, BOOK_ID, stub_gateway)
 
-    mock_gateway.refund_payment.assert_not_called()
+    # Verify that method was called with the correct arguments
+    assert stub_gateway.payment_calls == [{
+        "patron_id": PATRON_ID,
+        "amount": 10.50,
+        "description": "Late fees for 'The Great Gatsby'"
+    }]
 
-def test_refund_late_fee_invalid_amount_negative():
+def test_pay_late_fees_invalid_patron_id(stub_gateway):
     """
-    Test invalid refund amount (negative).
+    Test invalid patron ID.
     """
-    mock_gateway = Mock(spec=PaymentGateway)
-
-    # Attempt to refund invalid amount (negative)
-    success, msg = refund_late_fee_payment("txn_123", -0.50, mock_gateway)
+    # Attempt to pay late fee with invalid patron id
+    success, msg, txn = pay_late_fees("id123", BOOK_ID, stub_gateway)
 
     assert success == False
-    assert "must be greater than 0" in msg
+    assert "Invalid patron ID" in msg
+    assert txn is None
 
-    mock_gateway.refund_payment.assert_not_called()
+    # Verify that gateway is not called
+    assert stub_gateway.payment_calls == []
 
-def test_refund_late_fee_invalid_amount_zero():
+@pytest.mark.parametrize("transaction_id, amount, refund_result, expected_success, expected_msg, expected_calls", [
+    # Refund processed successfully through gateway
+    pytest.param(TXN_ID, 7.0, (True, "Refund processed successfully!"), True, "Refund processed successfully!", [(TXN_ID, 7.0)], id="successful_refund"),
+    # Refund declined by gateway
+    pytest.param(TXN_ID, 7.0, (False, "denied"), False, "Refund failed", [(TXN_ID, 7.0)], id="failed_refund"),
+    # Payment gateway raises a network error
+    pytest.param(TXN_ID, 7.0, Exception("network error"), False, "Refund processing error", [(TXN_ID, 7.0)], id="exception_handling"),
+    # Invalid transaction ID, so the gateway is never called
+    pytest.param("", 7.0, None, False, "Invalid transaction ID", [], id="invalid_transaction_id"),
+    # Invalid refund amount (negative)
+    pytest.param(TXN_ID, -0.50, None, False, "must be greater than 0", [], id="invalid_amount_negative"),
+    # Invalid refund amount (zero)
+    pytest.param(TXN_ID, 0.0, None, False, "must be greater than 0", [], id="invalid_amount_zero"),
+    # Invalid refund amount (exceeds $15 maximum)
+    pytest.param(TXN_ID, 15.50, None, False, "exceeds maximum late fee", [], id="invalid_amount_exceeds_max"),
+])
+def test_refund_late_fee_payment(stub_gateway, transaction_id, amount, refund_result, expected_success, expected_msg, expected_calls):
     """
-    Test invalid refund amount (zero).
+    Test refunding late fees through the gateway: successful, declined, and failing refunds, and invalid requests that never reach the gateway.
     """
-    mock_gateway = Mock(spec=PaymentGateway)
+    if refund_result is not None:
+        stub_gateway.refund_result = refund_result
 
-    # Attempt to refund invalid amount (0)
-    success, msg = refund_late_fee_payment("txn_123", 0.0, mock_gateway)
+    success, msg = refund_late_fee_payment(transaction_id, amount, stub_gateway)
 
-    assert success == False
-    assert "must be greater than 0" in msg
+    assert (success, stub_gateway.refund_calls) == (expected_success, expected_calls)
+    assert expected_msg in msg
 
-    mock_gateway.refund_payment.assert_not_called()
-
-def test_refund_late_fee_invalid_amount_exceeds_max():
+@pytest.mark.parametrize("method", ["process_payment", "refund_payment"])
+def test_stub_gateway_matches_payment_gateway(method):
     """
-    Test invalid refund amount (exceeds $15 maximum).
+    Test the stub gateway's methods take the same parameters as the real gateway's, so calls the stub accepts would also work against PaymentGateway.
     """
-    mock_gateway = Mock(spec=PaymentGateway)
-
-    # Attempt to refund invalid amount (over $15)
-    success, msg = refund_late_fee_payment("txn_123", 15.50, mock_gateway)
+    stub_params = inspect.signature(getattr(StubGateway, method)).parameters
+    real_params = inspect.signature(getattr(PaymentGateway, method)).parameters
 
-    assert success == False
-    assert "exceeds maximum late fee" in msg
-
-    mock_gateway.refund_payment.assert_not_called()
+    assert [(p.name, p.default) for p in stub_params.values()] == [(p.name, p.default) for p in real_params.values()]
 
 
 # ============================================================
@@ -193,186 +193,86 @@ def test_initialize_payment_gateway():
     assert gateway.api_key == "test_key_12345"
     assert gateway.base_url == "https://api.payment-gateway.example.com"
 
-def test_process_payment_invalid_amount():
-    """
-    Test processing a payment with an invalid amount.
-    """
-    gateway = PaymentGateway()
-    # Process payment with invalid amount (0)
-    success, txn_id, msg = gateway.process_payment("123456", 0, "Late fees")
-
-    assert success == False
-    assert "Invalid amount: must be greater than 0" in msg
-
-def test_process_payment_limit_exceeding_amount():
-    """
-    Test processing a payment amount that exceeds the limit.
-    """
-    gateway = PaymentGateway()
-    # Process payment with amount above the limit
-    success, _, msg = gateway.process_payment("123456", 1001, "Excessive amount")
-
-    assert success == False
-    assert "Payment declined: amount exceeds limit" in msg
-
-def test_process_payment_invalid_patron_id():
-    """
-    Test processing a payment with an invalid patron ID.
-    """
-    gateway = PaymentGateway()
-    # Process payment with invalid patron ID
-    success, _, msg = gateway.process_payment("123", 10.0, "Late fees")
-
-    assert success == False
-    assert "Invalid patron ID format" in msg
-
-def test_process_payment_successful_payment():
-    """
-    Test processing a successful payment.
-    """
-    gateway = PaymentGateway()
-    # Process valid payment
-    success, txn_id, msg = gateway.process_payment("123456", 6.50, "Late fees")
-
-    assert success == True
-    assert txn_id.startswith("txn_") == True
-    assert "Payment of $6.50 processed successfully" in msg
-
-def test_refund_payment_invalid_transaction_id():
-    """
-    Test refund with invalid transaction ID.
-    """
-    gateway = PaymentGateway()
-    # Try refunding with invalid transaction ID
-    success, msg = gateway.refund_payment("123txn_", 8.50)
-
-    assert success == False
-    assert "Invalid transaction ID" in msg
-
-def test_refund_payment_invalid_refund_amt():
-    """
-    Test refund with invalid refund amount.
-    """
-    gateway = PaymentGateway()
-    # Try refunding with invalid refund amount (0)
-    success, msg = gateway.refund_payment("txn_123", 0.0)
-
-    assert success == False
-    assert "Invalid refund amount" in msg
-
-def test_refund_payment_successful_refund():
-    """
-    Test successful refund.
-    """
-    gateway = PaymentGateway()
-    # Process valid refund
-    success, msg = gateway.refund_payment("txn_123", 3.0)
-
-    assert success == True
-    assert "Refund of $3.00 processed successfully" in msg
-
-def test_verify_payment_status_invalid_transaction_id():
-    """
-    Test verifying payment status with an invalid transaction ID.
-    """
-    gateway = PaymentGateway()
-    # Attempt to verify payment status with invalid transaction ID
-    status_info = gateway.verify_payment_status("invalid123")
-
-    assert status_info["status"] == "not_found"
-    assert status_info["message"] == "Transaction not found"
-
-def test_verify_payment_status_valid_transaction_id(mocker):
-    """
-    Test verifying payment status with a valid transaction ID.
+@pytest.mark.parametrize("patron_id, amount, expected_success, expected_txn, expected_msg", [
+    # Valid payment
+    pytest.param(PATRON_ID, 6.50, True, "txn_123456_1762743099", "Payment of $6.50 processed successfully", id="successful_payment"),
+    # Invalid amount (0)
+    pytest.param(PATRON_ID, 0, False, "", "Invalid amount: must be greater than 0", id="invalid_amount"),
+    # Amount above the limit
+    pytest.param(PATRON_ID, 1001, False, "", "Payment declined: amount exceeds limit", id="limit_exceeding_amount"),
+    # Invalid patron ID
+    pytest.param("123", 10.0, False, "", "Invalid patron ID format", id="invalid_patron_id"),
+])
+def test_process_payment(gateway, frozen_time, patron_id, amount, expected_success, expected_txn, expected_msg):
+    """
+    Test processing payments: a valid payment, and payments rejected for their amount or patron ID.
+    """
+    success, txn_id, msg = gateway.process_payment(patron_id, amount, "Late fees")
+
+    assert success == expected_success
+    assert txn_id == expected_txn
+    assert expected_msg in msg
+
+@pytest.mark.parametrize("transaction_id, amount, expected_success, expected_msg", [
+    # Valid refund
+    pytest.param(TXN_ID, 3.0, True, "Refund of $3.00 processed successfully", id="successful_refund"),
+    # Invalid transaction ID
+    pytest.param("123txn_", 8.50, False, "Invalid transaction ID", id="invalid_transaction_id"),
+    # Invalid refund amount (0)
+    pytest.param(TXN_ID, 0.0, False, "Invalid refund amount", id="invalid_refund_amt"),
+])
+def test_refund_payment(gateway, transaction_id, amount, expected_success, expected_msg):
+    """
+    Test refunding payments: a valid refund, and refunds rejected for their transaction ID or amount.
+    """
+    success, msg = gateway.refund_payment(transaction_id, amount)
+
+    assert success == expected_success
+    assert expected_msg in msg
+
+@pytest.mark.parametrize("transaction_id, expected_status", [
+    # Valid transaction ID
+    pytest.param("txn_123456_1762743099", {"transaction_id": "txn_123456_1762743099", "status": "completed", "amount": 10.50, "timestamp": 1762743099.451787}, id="valid_transaction_id"),
+    # Invalid transaction ID
+    pytest.param("invalid123", {"status": "not_found", "message": "Transaction not found"}, id="invalid_transaction_id"),
+])
+def test_verify_payment_status(gateway, frozen_time, transaction_id, expected_status):
+    """
+    Test verifying the payment status of a valid and an unknown transaction.
     """
-    gateway = PaymentGateway()
-
-    # Stub specific timestamp for transaction ID
-    mocker.patch("time.time", return_value=1762743099.451787)
-
-    transaction_id = "txn_123456_1762743099"
-    # Verify payment status with valid transaction ID
     status_info = gateway.verify_payment_status(transaction_id)
 
-    assert status_info["transaction_id"] == transaction_id
-    assert status_info["status"] == "completed"
-    assert status_info["amount"] == 10.50
-    assert status_info["timestamp"] == 1762743099.451787
+    assert status_info == expected_status
 
 # ============================================================
 #               TASK 2.2: CODE COVERAGE TESTING
 #                    (library_service.py)
 # ============================================================
 
-def test_pay_late_fees_no_fee_amount(mocker):
-    """
-    Test paying late fee when no fee is calculated (no fee to pay).
-    """
-    # Stub late fee calculation returns None
-    mocker.patch("services.library_service.calculate_late_fee_for_book", return_value=None)
-
-    mock_gateway = Mock(spec=PaymentGateway)
-    # Try paying late fees with no calculated fee amount
-    success, msg, txn = pay_late_fees("123456", 1, mock_gateway)
-
-    assert success == False
-    assert "Unable to calculate late fees" in msg
-    assert txn is None
-
-    # Verify that gateway is not called
-    mock_gateway.process_payment.assert_not_called()
-
-def test_pay_late_fees_no_book_found(mocker):
-    """
-    Test paying late fee when book is not found.
-    """
-    mocker.patch("services.library_service.calculate_late_fee_for_book", return_value={"fee_amount": 3.0})
-    # Stub book not found in the database
-    mocker.patch("database.get_book_by_id", return_value=None)
-
-    mock_gateway = Mock(spec=PaymentGateway)
-    # Try paying late fees with non-existent book
-    success, msg, txn = pay_late_fees("123456", 100, mock_gateway)
-
-    assert success == False
-    assert "Book not found" in msg
-    assert txn is None
-
-    # Verify that gateway is not called
-    mock_gateway.process_payment.assert_not_called()
-
-def test_pay_late_fees_no_gateway(mocker):
+def test_pay_late_fees_no_gateway(stub_fee, stub_book, stub_gateway, mock_gateway):
     """
     Test paying late fee with no provided payment gateway.
     """
-    mocker.patch("services.library_service.calculate_late_fee_for_book", return_value={"fee_amount": 10.50})
-    mocker.patch("database.get_book_by_id", return_value={"title": "The Great Gatsby"})
-
-    mock_gateway_instance = Mock(spec=PaymentGateway)
-    mock_gateway_instance.process_payment.return_value = (True, "txn_123", "success")
-    mock_gateway = mocker.patch("services.library_service.PaymentGateway", return_value=mock_gateway_instance)
+    stub_gateway.payment_result = (True, TXN_ID, "success")
 
     # Attempt to pay late fee without provided gateway
-    success, msg, txn = pay_late_fees("123456", 1, None)
+    success, msg, txn = pay_late_fees(PATRON_ID, BOOK_ID, None)
 
     assert success == True
     assert "Payment successful" in msg
-    assert txn == "txn_123"
+    assert txn == TXN_ID
 
     # Verify that gateway was called once to show new gateway was created
     mock_gateway.assert_called_once()
 
-def test_refund_late_fee_payment_no_gateway(mocker):
+def test_refund_late_fee_payment_no_gateway(stub_gateway, mock_gateway):
     """
     Test refunding late fee with no provided payment gateway.
     """
-    mock_gateway_instance = Mock(spec=PaymentGateway)
-    mock_gateway_instance.refund_payment.return_value = (True, "Refund processed successfully!")
-    mock_gateway = mocker.patch("services.library_service.PaymentGateway", return_value=mock_gateway_instance)
+    stub_gateway.refund_result = (True, "Refund processed successfully!")
 
     # Attempt to refund late fee without provided gateway
-    success, msg = refund_late_fee_payment("txn_123", 7.0, None)
+    success, msg = refund_late_fee_payment(TXN_ID, 7.0, None)
 
     assert success == True
     assert "Refund processed successfully" in msg
@@ -380,110 +280,36 @@ def test_refund_late_fee_payment_no_gateway(mocker):
     # Verify that gateway was called once to show new gateway was created
     mock_gateway.assert_called_once()
 
-def test_refund_late_fee_payment_failed_refund(mocker):
-    """
-    Test refunding late fee when refund fails.
-    """
-    mock_gateway = Mock(spec=PaymentGateway)
-    mock_gateway.refund_payment.return_value = (False, "denied")
-
-    # Attempt to refund late fee (should fail)
-    success, msg = refund_late_fee_payment("txn_123", 7.0, mock_gateway)
-
-    assert success == False
-    assert "Refund failed" in msg
-
-    mock_gateway.refund_payment.assert_called_once()
-
-def test_refund_late_fee_payment_exception_handling(mocker):
-    """
-    Test refunding late fee when exception is raised.
-    """
-    mock_gateway = Mock(spec=PaymentGateway)
-    # Payment gateway should raise an exception
-    mock_gateway.refund_payment.side_effect = Exception("network error")
-    
-    # Try refunding late fee (should throw exception)
-    success, msg = refund_late_fee_payment("txn_123", 7.0, mock_gateway)
-
-    assert success == False
-    assert "Refund processing error" in msg
-
-    mock_gateway.refund_payment.assert_called_once()
-
-def test_add_book_database_error(mocker):
+def test_refund_late_fee_payment_reuses_default_gateway(stub_gateway, mock_gateway):
     """
-    R1: Test adding a book when there is a database error
+    Test refunding late fees twice with no provided payment gateway only creates one gateway.
     """
-    mocker.patch("services.library_service.get_book_by_isbn", return_value=None)
-    # Stub database function to simulate condition that database error gets triggered
-    mocker.patch("services.library_service.insert_book", return_value=False)
+    stub_gateway.refund_result = (True, "Refund processed successfully!")
 
-    # Try adding a book 
-    success, msg = add_book_to_catalog("Title Title", "Author Author", "1010101010101", 10)
+    # Refund twice without provided gateway
+    refund_late_fee_payment(TXN_ID, 7.0, None)
+    refund_late_fee_payment("txn_456", 3.0, None)
 
-    assert success == False
-    assert "Database error occurred while adding the book" in msg
-
-def test_borrow_book_borrow_success_error(mocker):
-    """
-    R3: Test borrowing a book when there is a database error while creating borrow record
-    """
-    mocker.patch("services.library_service.get_book_by_id", return_value={"title": "The Great Gatsby", "available_copies": 3})
-    mocker.patch("services.library_service.get_patron_borrowed_books", return_value=[])
-    mocker.patch("services.library_service.get_patron_borrow_count", return_value=2)
-    # Stub database function to simulate condition where database error gets triggered
-    mocker.patch("services.library_service.insert_borrow_record", return_value=False)
-
-    # Try borrowing a book
-    success, msg = borrow_book_by_patron("123456", 1)
-
-    assert success == False
-    assert "Database error occurred while creating borrow record" in msg
-
-def test_borrow_book_update_availability_error(mocker):
-    """
-    R3: Test borrowing a book when there is a database error while updating book availability
-    """
-    mocker.patch("services.library_service.get_book_by_id", return_value={"title": "The Great Gatsby", "available_copies": 3})
-    mocker.patch("services.library_service.get_patron_borrowed_books", return_value=[])
-    mocker.patch("services.library_service.get_patron_borrow_count", return_value=2)
-    mocker.patch("services.library_service.insert_borrow_record", return_value=True)
-    # Stub database function to simulate condition where database error gets triggered
-    mocker.patch("services.library_service.update_book_availability", return_value=False)
-
-    # Try borrowing a book
-    success, msg = borrow_book_by_patron("123456", 1)
-
-    assert success == False
-    assert "Database error occurred while updating book availability" in msg
-
-def test_return_book_update_availability_error(mocker):
-    """
-    R4: Test returning a book when there is a database error while updating book availability
-    """
-    mocker.patch("services.library_service.get_patron_borrowed_books", return_value=[{"book_id": 3}])
-    # Stub database function to simulate condition where database error gets triggered
-    mocker.patch("services.library_service.update_book_availability", return_value=False)
-
-    # Try returning a book
-    success, msg = return_book_by_patron("123456", 3)
-
-    assert success == False
-    assert "Database error occurred while updating book availability" in msg
+    # Verify that the gateway created for the first refund was reused for the second
+    mock_gateway.assert_called_once()
+    assert len(stub_gateway.refund_calls) == 2
 
-def test_return_book_record_return_date_error(mocker):
+@pytest.mark.parametrize("db_results, service, args, expected_msg", [
+    # R1: Database error while adding the book
+    pytest.param({"insert_book": None}, add_book_to_catalog, ("Title Title", "Author Author", "1010101010101", 10), "Database error occurred while adding the book", id="add_book"),
+    # R3: Database error while creating the borrow record
+    pytest.param({"get_borrow_context": {"book": {"title": "The Great Gatsby", "available_copies": 3}, "has_this": False, "count": 2}, "create_borrow_atomic": None}, borrow_book_by_patron, (PATRON_ID, 1), "Database error occurred while creating borrow record", id="borrow_book"),
+    # R4: Database error while updating the book return date
+    pytest.param({"close_loan": (False, None)}, return_book_by_patron, (PATRON_ID, 3), "Database error occurred while updating book return date", id="return_book"),
+])
+def test_database_error(mocker, db_results, service, args, expected_msg):
     """
-    R4: Test returning a book when there is a database error while updating book return date
+    Test each service reports a database error when its database call fails.
     """
-    mocker.patch("services.library_service.get_patron_borrowed_books", return_value=[{"book_id": 3}])
-    mocker.patch("services.library_service.update_book_availability", return_value=True)
-    mocker.patch("services.library_service.calculate_late_fee_for_book", return_value={"fee_amount": 0.0, "days_overdue": 0})
-    # Stub database function to simulate condition where database error gets triggered
-    mocker.patch("services.library_service.update_borrow_record_return_date", return_value=False)
+    # Stub database functions to simulate condition where database error gets triggered
+    mocker.patch.multiple(library_service, **{name: mocker.Mock(return_value=result) for name, result in db_results.items()})
 
-    # Try returning a book
-    success, msg = return_book_by_patron("123456", 3)
+    success, msg = service(*args)
 
     assert success == False
-    assert "Database error occurred while updating book return date" in msg
+    assert expected_msg in msg